@@ -0,0 +1,72 @@
+import heapq
+from itertools import islice
+
+from django.core.paginator import Paginator
+from django.http import QueryDict
+
+from .models import GameRental, PurchaseOrder, TableBooking
+
+SECTION_SIZE = 10
+FEED_SIZE = 10
+
+
+class CustomerActivity:
+    """
+    История клиента для профиля: бронирования, аренды и заказы.
+
+    Каждый раздел загружается отдельной страницей с select_related, поэтому
+    число запросов не зависит от длины истории.
+    """
+
+    def __init__(self, customer, params=None, per_page=SECTION_SIZE):
+        self.customer = customer
+        self.params = params or {}
+        self.bookings = self._page(
+            TableBooking.objects.filter(customer=customer).select_related('table').order_by('-created_at', '-id'),
+            'bookings_page', per_page,
+        )
+        self.rentals = self._page(
+            GameRental.objects.filter(customer=customer).select_related('game').order_by('-created_at', '-id'),
+            'rentals_page', per_page,
+        )
+        self.orders = self._page(
+            PurchaseOrder.objects.filter(customer=customer).order_by('-created_at', '-id'),
+            'orders_page', per_page,
+        )
+
+    def _page(self, queryset, param, per_page):
+        page = Paginator(queryset, per_page).get_page(self.params.get(param))
+        # Ссылки соседних страниц сохраняют остальные параметры запроса,
+        # в том числе номера страниц других разделов
+        if page.has_previous():
+            page.previous_query = self._query(param, page.previous_page_number())
+        if page.has_next():
+            page.next_query = self._query(param, page.next_page_number())
+        return page
+
+    def _query(self, param, number):
+        query = QueryDict(mutable=True)
+        query.update(self.params)
+        query[param] = number
+        return query.urlencode()
+
+    def feed(self, size=FEED_SIZE):
+        """Последние события из всех разделов в хронологическом порядке (сначала новые)."""
+        sections = [
+            ('booking', self._latest(self.bookings, size)),
+            ('rental', self._latest(self.rentals, size)),
+            ('order', self._latest(self.orders, size)),
+        ]
+        merged = heapq.merge(
+            *[((kind, item) for item in items) for kind, items in sections],
+            key=lambda entry: entry[1].created_at,
+            reverse=True,
+        )
+        return [{'kind': kind, 'item': item} for kind, item in islice(merged, size)]
+
+    @staticmethod
+    def _latest(page, size):
+        # Первая страница раздела уже загружена - переиспользуем ее
+        if page.number == 1 and (len(page.object_list) >= size or not page.has_next()):
+            return list(page.object_list)[:size]
+        return list(page.paginator.object_list[:size])
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Game, GameTable, Customer, TableBooking, GameRental, PurchaseOrder, OrderItem
+from .models import Game, GameTable, Customer, TableBooking, GameRental, PurchaseOrder, OrderItem, Job
+from . import search
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
@@ -7,6 +8,13 @@ class GameAdmin(admin.ModelAdmin):
     list_filter = ['category', 'difficulty']
     search_fields = ['name', 'description']
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по инвертированному индексу вместо icontains по всей таблице;
+        # подзапрос, а не search_ids: в списке админки нужны все совпадения
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(search_term)), False
+
 @admin.register(GameTable)
 class GameTableAdmin(admin.ModelAdmin):
     list_display = ['name', 'table_type', 'capacity', 'price_per_hour_per_person', 'is_active']
@@ -38,4 +46,10 @@ class PurchaseOrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'customer', 'total_amount', 'status', 'created_at']
     list_filter = ['status', 'created_at']
     search_fields = ['customer__user__username']
-    inlines = [OrderItemInline]
\ No newline at end of file
+    inlines = [OrderItemInline]
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'created_at']
+    list_filter = ['status', 'task']
+    readonly_fields = ['locked_by', 'locked_at', 'last_error', 'finished_at']
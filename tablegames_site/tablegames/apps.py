@@ -3,4 +3,7 @@ from django.apps import AppConfig
 class TablegamesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tablegames'
-    verbose_name = 'Настольные игры'
\ No newline at end of file
+    verbose_name = 'Настольные игры'
+
+    def ready(self):
+        from . import database, signals, tasks  # noqa: F401
@@ -0,0 +1,138 @@
+import datetime
+from bisect import bisect_left
+from itertools import accumulate
+
+from . import caching
+from .models import GameTable, TableBooking
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+class DaySchedule:
+    """
+    Занятость столиков на один день.
+
+    Для каждого столика хранятся интервалы броней, отсортированные по началу,
+    и префиксный максимум их окончаний: проверка пересечения сводится к
+    одному бинарному поиску.
+    """
+
+    def __init__(self, booking_date, rows):
+        self.booking_date = booking_date
+        self._starts = {}
+        self._ends = {}
+        for table_id, start_time, end_time in rows:
+            self._starts.setdefault(table_id, []).append(start_time)
+            self._ends.setdefault(table_id, []).append(end_time)
+        self._max_ends = {table_id: list(accumulate(ends, max)) for table_id, ends in self._ends.items()}
+
+    @classmethod
+    def load(cls, booking_date, tables=None, exclude=None):
+        bookings = TableBooking.objects.filter(booking_date=booking_date, status__in=ACTIVE_STATUSES)
+        if tables is not None:
+            bookings = bookings.filter(table__in=tables)
+        if exclude is not None:
+            bookings = bookings.exclude(pk=exclude.pk)
+        rows = bookings.order_by('table_id', 'start_time').values_list('table_id', 'start_time', 'end_time')
+        return cls(booking_date, rows)
+
+    def is_free(self, table_id, start_time, end_time):
+        starts = self._starts.get(table_id)
+        if not starts:
+            return True
+        # Брони с началом раньше end_time занимают префикс [0, i)
+        i = bisect_left(starts, end_time)
+        return i == 0 or self._max_ends[table_id][i - 1] <= start_time
+
+    def busy_intervals(self, table_id):
+        return list(zip(self._starts.get(table_id, []), self._ends.get(table_id, [])))
+
+
+def free_tables(booking_date, start_time, end_time, number_of_people=None, tables=None):
+    """Активные столики, свободные в указанный интервал и вмещающие number_of_people."""
+    if tables is None:
+        tables = GameTable.objects.filter(is_active=True)
+    if number_of_people:
+        tables = tables.filter(capacity__gte=number_of_people)
+    tables = list(tables)
+
+    schedule = DaySchedule.load(booking_date, tables=[table.pk for table in tables])
+    return [table for table in tables if schedule.is_free(table.pk, start_time, end_time)]
+
+
+def is_table_free(table, booking_date, start_time, end_time, exclude=None):
+    schedule = DaySchedule.load(booking_date, tables=[table.pk], exclude=exclude)
+    return schedule.is_free(table.pk, start_time, end_time)
+
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+GRID_CACHE_TIMEOUT = 60 * 60
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_bitmap(intervals):
+    """
+    Битовая маска занятых слотов дня в виде hex-строки.
+
+    Бит i означает, что слот [i * SLOT_MINUTES, (i + 1) * SLOT_MINUTES)
+    пересекается хотя бы с одной бронью.
+    """
+    mask = 0
+    for start_time, end_time in intervals:
+        first = _minutes(start_time) // SLOT_MINUTES
+        last = -(-_minutes(end_time) // SLOT_MINUTES)
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << first
+    return format(mask, f'0{SLOTS_PER_DAY // 4}x')
+
+
+def _day_key(table_id, booking_date):
+    """Срез броней для версии caching: один столик за один день."""
+    return f'{table_id}:{booking_date.isoformat()}'
+
+
+def availability_grid(start_date, days, tables=None):
+    """
+    Маски занятости для каждого столика на days дней начиная со start_date.
+
+    Возвращает {table_id: {date: hex}}. Каждая пара (столик, день) кешируется
+    отдельно и зависит от версии своего среза броней; недостающие считаются
+    одним запросом по диапазону дат.
+    """
+    if tables is None:
+        tables = GameTable.objects.filter(is_active=True)
+    table_ids = [getattr(table, 'pk', table) for table in tables]
+    dates = [start_date + datetime.timedelta(days=offset) for offset in range(days)]
+
+    keys = {f'availability:{_day_key(table_id, day)}': (table_id, day) for table_id in table_ids for day in dates}
+
+    def compute(missing):
+        cells = [keys[key] for key in missing]
+        missing_dates = [day for table_id, day in cells]
+        intervals = {}
+        rows = TableBooking.objects.filter(
+            table__in={table_id for table_id, day in cells},
+            booking_date__range=(min(missing_dates), max(missing_dates)),
+            status__in=ACTIVE_STATUSES,
+        ).values_list('table_id', 'booking_date', 'start_time', 'end_time')
+        for table_id, day, start_time, end_time in rows:
+            intervals.setdefault((table_id, day), []).append((start_time, end_time))
+        return {key: slot_bitmap(intervals.get(keys[key], [])) for key in missing}
+
+    bitmaps = caching.get_many_or_compute(
+        {key: [(TableBooking, _day_key(*cell))] for key, cell in keys.items()}, compute,
+        fresh=GRID_CACHE_TIMEOUT, stale=GRID_CACHE_TIMEOUT,
+    )
+    grid = {table_id: {} for table_id in table_ids}
+    for key, (table_id, day) in keys.items():
+        grid[table_id][day] = bitmaps[key]
+    return grid
+
+
+def invalidate_grid(table_id, booking_date):
+    """Сбрасывает ячейку сетки после коммита, чтобы не закешировать данные до него."""
+    caching.invalidate(TableBooking, [_day_key(table_id, booking_date)])
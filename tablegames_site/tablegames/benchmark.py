@@ -0,0 +1,422 @@
+import asyncio
+import datetime
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from . import catalog, instrumentation
+from .models import (
+    Cart, CartItem, Customer, Game, GameRental, GameTable, OrderItem, PurchaseOrder, TableBooking,
+)
+
+# Имена сценариев совпадают с именами URL: количество запросов к БД берется
+# из статистики QueryStatsMiddleware
+SCENARIOS = (
+    'index', 'game_list', 'game_detail', 'add_to_cart', 'update_cart_item',
+    'create_order_from_cart', 'create_booking',
+)
+PERCENTILES = (50, 95, 99)
+PASSWORD = 'benchmark'
+BATCH_SIZE = 1000
+BOOKING_HOURS = (10, 12, 14, 16, 18, 20)
+
+
+@contextmanager
+def test_database(keepdb=False):
+    """Отдельная тестовая база на время прогона: рабочая база не трогается."""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def seed(games=2000, users=2000, tables=30, bookings=20000, rentals=20000, orders=20000, random_seed=42):
+    """
+    Заполняет пустую базу синтетическими данными.
+
+    Все строки создаются через bulk_create: сигналы не срабатывают, поэтому
+    версия каталога сбрасывается в конце вручную.
+    """
+    rng = random.Random(random_seed)
+    today = timezone.localdate()
+    categories = [key for key, label in Game.GAME_CATEGORIES]
+
+    with transaction.atomic():
+        game_rows = []
+        for index in range(games):
+            min_players = rng.randint(1, 4)
+            game_rows.append(Game(
+                name=f'Игра {index}',
+                description=f'Настольная игра номер {index} для компании друзей',
+                category=rng.choice(categories),
+                price=Decimal(rng.randrange(500, 9000)),
+                rental_price_per_day=Decimal(rng.randrange(100, 500)),
+                min_players=min_players,
+                max_players=min_players + rng.randint(0, 6),
+                play_time_minutes=rng.choice([15, 30, 45, 60, 90, 120, 180]),
+                difficulty=rng.randint(1, 5),
+                in_stock=rng.randint(100, 1000),
+                available_for_rental=rng.randint(0, 20),
+            ))
+        Game.objects.bulk_create(game_rows, batch_size=BATCH_SIZE)
+        game_ids = list(Game.objects.values_list('pk', flat=True))
+
+        GameTable.objects.bulk_create([
+            GameTable(
+                name=f'Стол {index}',
+                table_type=rng.choice(['small', 'medium', 'large', 'vip']),
+                capacity=rng.choice([4, 6, 8, 10]),
+            )
+            for index in range(tables)
+        ])
+        table_ids = list(GameTable.objects.values_list('pk', flat=True))
+
+        # Один хеш на всех: PBKDF2 для тысяч пользователей занял бы минуты
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(username=f'bench{index}', password=password) for index in range(users)
+        ], batch_size=BATCH_SIZE)
+        user_ids = list(User.objects.filter(username__startswith='bench').values_list('pk', flat=True))
+        Customer.objects.bulk_create([
+            Customer(user_id=user_id, phone='', address='Москва') for user_id in user_ids
+        ], batch_size=BATCH_SIZE)
+        customer_ids = list(Customer.objects.values_list('pk', flat=True))
+
+        Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in user_ids], batch_size=BATCH_SIZE)
+        prices = dict(Game.objects.values_list('pk', 'price'))
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, game_id=game_id, quantity=rng.randint(1, 3), unit_price=prices[game_id])
+            for cart in Cart.objects.only('pk')
+            for game_id in rng.sample(game_ids, rng.randint(0, 3))
+        ], batch_size=BATCH_SIZE)
+        Cart.recalculate_totals()
+
+        # Уникальность (столик, день, начало) обеспечивается выборкой без повторений
+        slots = [
+            (table_id, offset, hour)
+            for table_id in table_ids
+            for offset in range(-300, 60)
+            for hour in BOOKING_HOURS
+        ]
+        TableBooking.objects.bulk_create([
+            TableBooking(
+                customer_id=rng.choice(customer_ids),
+                table_id=table_id,
+                booking_date=today + datetime.timedelta(days=offset),
+                start_time=datetime.time(hour),
+                end_time=datetime.time(hour + 2),
+                number_of_people=2,
+                total_price=Decimal('240.00'),
+                status='completed' if offset < 0 else 'confirmed',
+            )
+            for table_id, offset, hour in rng.sample(slots, min(bookings, len(slots)))
+        ], batch_size=BATCH_SIZE)
+
+        rental_rows = []
+        for _ in range(rentals):
+            start = today + datetime.timedelta(days=rng.randint(-300, 30))
+            rental_rows.append(GameRental(
+                customer_id=rng.choice(customer_ids),
+                game_id=rng.choice(game_ids),
+                rental_start_date=start,
+                rental_end_date=start + datetime.timedelta(days=rng.randint(1, 14)),
+                total_price=Decimal('300.00'),
+                status='completed' if start < today else 'pending',
+            ))
+        GameRental.objects.bulk_create(rental_rows, batch_size=BATCH_SIZE)
+
+        # bulk_create не вызывает PurchaseOrder.save, поэтому номера задаются явно
+        PurchaseOrder.objects.bulk_create([
+            PurchaseOrder(
+                customer_id=rng.choice(customer_ids),
+                order_number=f'BENCH{index:07d}',
+                total_amount=Decimal('2500.00'),
+                status=rng.choice(['new', 'confirmed', 'delivered', 'cancelled']),
+                shipping_address='Москва',
+            )
+            for index in range(orders)
+        ], batch_size=BATCH_SIZE)
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id=order_id, game_id=rng.choice(game_ids), quantity=1, price=Decimal('2500.00'))
+            for order_id in PurchaseOrder.objects.values_list('pk', flat=True)
+        ], batch_size=BATCH_SIZE)
+
+    catalog.invalidate()
+    return {
+        'games': len(game_ids), 'tables': len(table_ids), 'users': len(user_ids),
+        'bookings': TableBooking.objects.count(), 'rentals': rentals, 'orders': orders,
+    }
+
+
+def percentile(values, point):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))]
+
+
+class StorefrontBenchmark:
+    """
+    Прогоняет основные сценарии витрины через тестовый клиент.
+
+    Каждый поток - отдельный покупатель со своей сессией: открывает главную,
+    каталог и карточку игры, добавляет игру в корзину, меняет количество,
+    оформляет заказ и бронирует столик.
+    """
+
+    def __init__(self, iterations=50, concurrency=1, random_seed=42):
+        self.iterations = iterations
+        self.concurrency = concurrency
+        self.random_seed = random_seed
+        self.timings = {name: [] for name in SCENARIOS}
+        self.errors = {name: 0 for name in SCENARIOS}
+        self._lock = threading.Lock()
+
+    def run(self):
+        self.game_ids = list(Game.objects.filter(in_stock__gt=0).values_list('pk', flat=True))
+        self.table_ids = list(GameTable.objects.filter(is_active=True, capacity__gte=2).values_list('pk', flat=True))
+        self.users = list(User.objects.filter(username__startswith='bench').order_by('pk')[:self.concurrency])
+        categories = [key for key, label in Game.GAME_CATEGORIES]
+        self.list_paths = ['/games/'] + [f'/games/?category={key}' for key in categories]
+
+        instrumentation.registry.reset()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(self._worker, range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+        return self.report(elapsed)
+
+    def _worker(self, index):
+        rng = random.Random(self.random_seed + index)
+        client = Client()
+        client.force_login(self.users[index])
+        try:
+            for _ in range(index, self.iterations, self.concurrency):
+                self._flow(client, rng, self.users[index])
+        finally:
+            connection.close()
+
+    def _request(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        response = method(path, **kwargs)
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.timings[name].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[name] += 1
+        return response
+
+    def _flow(self, client, rng, user):
+        game_id = rng.choice(self.game_ids)
+        self._request('index', client.get, '/')
+        self._request('game_list', client.get, rng.choice(self.list_paths))
+        self._request('game_detail', client.get, f'/games/{game_id}/')
+        self._request('add_to_cart', client.post, f'/cart/add/{game_id}/')
+
+        item = CartItem.objects.filter(cart__user=user, game_id=game_id).first()
+        if item is not None:
+            self._request(
+                'update_cart_item', client.post, f'/cart/update/{item.pk}/',
+                data=json.dumps({'action': 'increase'}), content_type='application/json',
+            )
+        self._request('create_order_from_cart', client.post, '/order/create/', data={'password': PASSWORD})
+
+        hour = rng.choice(BOOKING_HOURS)
+        self._request('create_booking', client.post, '/booking/create/', data={
+            'table': rng.choice(self.table_ids),
+            'booking_date': (timezone.localdate() + datetime.timedelta(days=rng.randint(1, 60))).isoformat(),
+            'start_time': f'{hour:02d}:00',
+            'end_time': f'{hour + 2:02d}:00',
+            'number_of_people': 2,
+        })
+
+    def report(self, elapsed):
+        queries = instrumentation.registry.snapshot()
+        scenarios = {}
+        for name in SCENARIOS:
+            timings = self.timings[name]
+            scenarios[name] = {
+                'requests': len(timings),
+                'errors': self.errors[name],
+                **{f'p{point}_ms': round(percentile(timings, point), 2) for point in PERCENTILES},
+                'avg_queries': queries.get(name, {}).get('avg_queries', 0),
+            }
+        total = sum(len(timings) for timings in self.timings.values())
+        return {
+            'iterations': self.iterations,
+            'concurrency': self.concurrency,
+            'elapsed_s': round(elapsed, 2),
+            'throughput_rps': round(total / elapsed, 1) if elapsed else 0,
+            'scenarios': scenarios,
+        }
+
+
+def compare(report, baseline, query_tolerance=1, tolerance=None):
+    """
+    Список регрессий относительно базовой линии.
+
+    По умолчанию проверяется только то, что не зависит от машины: ошибки
+    сценариев и среднее число запросов к БД (рост не больше query_tolerance).
+    Задержки базовой линии сняты на конкретной машине, поэтому p95
+    сравнивается, только если передан tolerance - допустимый рост в долях.
+    Имеет смысл, когда базовая линия записана на той же машине (--write-baseline).
+    """
+    regressions = []
+    for name, expected in baseline.get('scenarios', {}).items():
+        actual = report['scenarios'].get(name)
+        if actual is None:
+            continue
+        if actual.get('errors'):
+            regressions.append(f'{name}: ошибок {actual["errors"]}')
+        if actual['avg_queries'] > expected['avg_queries'] + query_tolerance:
+            regressions.append(
+                f'{name}: {actual["avg_queries"]} запросов > {expected["avg_queries"]} + {query_tolerance}'
+            )
+        if tolerance is not None:
+            limit = expected['p95_ms'] * (1 + tolerance)
+            if actual['p95_ms'] > limit:
+                regressions.append(f'{name}: p95 {actual["p95_ms"]} мс > {limit:.2f} мс')
+    return regressions
+
+
+CART_SCENARIOS = ('add_to_cart', 'update_cart_item', 'get_cart_count')
+
+
+class CartServerBenchmark:
+    """
+    Пропускная способность JSON-эндпоинтов корзины под WSGI и под ASGI.
+
+    WSGI: поток на покупателя, запросы идут через WSGIHandler (Client).
+    ASGI: все покупатели - корутины одного цикла событий, запросы идут через
+    ASGIHandler (AsyncClient), как в одном воркере uvicorn. Сеть в замер не
+    входит - сравниваются обработчики и модель конкурентности.
+    """
+
+    def __init__(self, concurrency=50, requests_per_user=30, random_seed=42):
+        self.concurrency = concurrency
+        self.requests_per_user = requests_per_user
+        self.random_seed = random_seed
+
+    def run(self):
+        self.users = list(User.objects.filter(username__startswith='bench').order_by('pk')[:self.concurrency])
+        self.game_ids = list(Game.objects.filter(in_stock__gt=0).values_list('pk', flat=True))
+
+        self._reset_items()
+        wsgi = self.run_wsgi()
+        # Сбои WSGI-прогона могли удалить позиции - ASGI начинает с того же состояния
+        self._reset_items()
+        asgi = asyncio.run(self.run_asgi())
+        return {'wsgi': wsgi, 'asgi': asgi}
+
+    def _reset_items(self):
+        """У каждого покупателя есть позиция из двух штук, которую меняет update_cart_item."""
+        self.item_ids = {}
+        for user in self.users:
+            cart, created = Cart.objects.get_or_create(user=user)
+            game = Game.objects.get(pk=self.game_ids[user.pk % len(self.game_ids)])
+            item, created = CartItem.objects.get_or_create(
+                cart=cart, game=game, defaults={'quantity': 2, 'unit_price': game.price},
+            )
+            if item.quantity != 2:
+                item.quantity = 2
+                item.save()
+            self.item_ids[user.pk] = item.pk
+
+    def _plan(self, index, user):
+        rng = random.Random(self.random_seed + index)
+        requests = []
+        for number in range(self.requests_per_user):
+            name = CART_SCENARIOS[number % len(CART_SCENARIOS)]
+            if name == 'add_to_cart':
+                requests.append((name, f'/cart/add/{rng.choice(self.game_ids)}/', {}))
+            elif name == 'update_cart_item':
+                requests.append((name, f'/cart/update/{self.item_ids[user.pk]}/', {
+                    # Чередуем, чтобы позиция не удалилась и не уперлась в остаток
+                    'data': json.dumps({'action': 'decrease' if number // len(CART_SCENARIOS) % 2 else 'increase'}),
+                    'content_type': 'application/json',
+                }))
+            else:
+                requests.append((name, '/cart/count/', None))
+        return requests
+
+    @staticmethod
+    def _failed(response):
+        if response.status_code >= 400:
+            return True
+        return response.json().get('success') is False
+
+    def run_wsgi(self):
+        timings, errors = [], []
+        # Вход выполняется заранее и по очереди: он не входит в замер
+        clients = []
+        for user in self.users:
+            # Ошибки (например, "database is locked" у SQLite) считаем, а не пробрасываем
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            clients.append(client)
+
+        def worker(index):
+            try:
+                for name, path, kwargs in self._plan(index, self.users[index]):
+                    started = time.perf_counter()
+                    if kwargs is None:
+                        response = clients[index].get(path)
+                    else:
+                        response = clients[index].post(path, **kwargs)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    if self._failed(response):
+                        errors.append(name)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(worker, range(self.concurrency)))
+        return self._summary(timings, errors, time.perf_counter() - started)
+
+    async def run_asgi(self):
+        timings, errors = [], []
+        clients = []
+        for user in self.users:
+            client = AsyncClient(raise_request_exception=False)
+            await client.aforce_login(user)
+            clients.append(client)
+
+        async def worker(index):
+            for name, path, kwargs in self._plan(index, self.users[index]):
+                started = time.perf_counter()
+                if kwargs is None:
+                    response = await clients[index].get(path)
+                else:
+                    response = await clients[index].post(path, **kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+                if self._failed(response):
+                    errors.append(name)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(self.concurrency)))
+        return self._summary(timings, errors, time.perf_counter() - started)
+
+    @staticmethod
+    def _summary(timings, errors, elapsed):
+        return {
+            'requests': len(timings),
+            'errors': len(errors),
+            'elapsed_s': round(elapsed, 2),
+            'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else 0,
+            **{f'p{point}_ms': round(percentile(timings, point), 2) for point in PERCENTILES},
+        }
@@ -0,0 +1,48 @@
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+
+from . import jobs
+from .availability import is_table_free
+from .models import TableDayLock
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+
+class BookingConflict(Exception):
+    """Столик уже занят на выбранное время."""
+
+
+def _lock_table_day(table, booking_date):
+    lock, created = TableDayLock.objects.get_or_create(table=table, booking_date=booking_date)
+    # UPDATE берет блокировку строки (PostgreSQL) или блокировку записи (SQLite)
+    # до проверки пересечений, поэтому параллельные брони одного столика на
+    # один день выполняются строго по очереди
+    TableDayLock.objects.filter(pk=lock.pk).update(version=F('version') + 1)
+
+
+def commit_booking(booking):
+    """
+    Сохраняет бронь, повторно проверяя пересечения под блокировкой (столик, день).
+
+    При конфликте блокировок (IntegrityError при создании строки-замка,
+    "database is locked" в SQLite) попытка повторяется с задержкой.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                _lock_table_day(booking.table, booking.booking_date)
+                if not is_table_free(booking.table, booking.booking_date,
+                                     booking.start_time, booking.end_time,
+                                     exclude=booking if booking.pk else None):
+                    raise BookingConflict('Этот столик уже забронирован на выбранное время')
+                booking.save()
+                jobs.enqueue('send_booking_confirmation', {'booking_id': booking.pk})
+                return booking
+        except (IntegrityError, OperationalError):
+            if attempt == MAX_ATTEMPTS:
+                raise
+            time.sleep(RETRY_DELAY * attempt * (1 + random.random()))
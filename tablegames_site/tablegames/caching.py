@@ -0,0 +1,176 @@
+import functools
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+FRESH_SECONDS = 60
+STALE_SECONDS = 60 * 60 * 24
+LOCK_SECONDS = 10
+# Холодный кеш: сколько ждать, пока значение посчитает другой запрос
+WAIT_SECONDS = 2
+WAIT_STEP = 0.05
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def version_key(model, pk=None):
+    if pk is None:
+        return f'tablegames:version:{_label(model)}'
+    return f'tablegames:version:{_label(model)}:{pk}'
+
+
+def _dependency_keys(deps):
+    """
+    Зависимость - модель целиком (Model) или одна строка (Model, pk).
+
+    Вместо pk может стоять строковый ключ среза строк, например брони
+    столика за день: (TableBooking, '3:2026-10-20'). Такую версию сбрасывают
+    явно - invalidate(TableBooking, ['3:2026-10-20']).
+    """
+    return [version_key(*dep) if isinstance(dep, tuple) else version_key(dep) for dep in deps]
+
+
+def _versions(keys, values):
+    """
+    Версии зависимостей из уже прочитанного get_many.
+
+    Вытесненная версия заменяется новой (по времени), чтобы не совпасть ни с
+    одной сохраненной записью.
+    """
+    versions = []
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+        versions.append(values[key])
+    return tuple(versions)
+
+
+def versions(deps):
+    """
+    Текущие версии зависимостей одним get_many.
+
+    Для ключей, которые строятся снаружи, например ключей фрагментов шаблонов.
+    """
+    keys = _dependency_keys(deps)
+    return _versions(keys, cache.get_many(keys))
+
+
+def entry_key(key):
+    return f'tablegames:cached:{key}'
+
+
+def _bump(keys):
+    transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, timeout=None))
+
+
+def invalidate(model, pks=None):
+    """
+    Новые версии модели (pks=None) или ее строк после коммита транзакции.
+
+    Сигналы моделей приложения сбрасывают и модель, и строку. Массовые
+    UPDATE, которые меняют только поля отдельных строк (остатки на складе),
+    сбрасывают строки: списки, зависящие от модели целиком, досчитаются по TTL.
+    """
+    _bump([version_key(model)] if pks is None else [version_key(model, pk) for pk in pks])
+
+
+def invalidate_instance(instance):
+    model = type(instance)
+    _bump([version_key(model), version_key(model, instance.pk)])
+
+
+def get_or_compute(key, compute, deps=(), fresh=FRESH_SECONDS, stale=STALE_SECONDS):
+    """
+    Значение из кеша с версиями зависимостей, защитой от лавины и stale-while-revalidate.
+
+    Запись актуальна, пока не истек fresh и не сменилась версия ни одной из
+    deps. Иначе пересчитывает ее ровно один запрос - взявший блокировку
+    cache.add; остальные получают прежнее значение. Если записи нет совсем,
+    остальные ждут результат до WAIT_SECONDS и только потом считают сами.
+    """
+    key = entry_key(key)
+    dependency_keys = _dependency_keys(deps)
+    values = cache.get_many([key, *dependency_keys])
+    entry = values.pop(key, None)
+    versions = _versions(dependency_keys, values)
+    if entry is not None and entry['versions'] == versions and entry['fresh_until'] > time.time():
+        return entry['value']
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_SECONDS):
+        try:
+            value = compute()
+            cache.set(key, {'versions': versions, 'fresh_until': time.time() + fresh, 'value': value}, stale)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry['value']
+
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+    return compute()
+
+
+def get_many_or_compute(deps_by_key, compute, fresh=FRESH_SECONDS, stale=STALE_SECONDS):
+    """
+    Пакетный get_or_compute: {key: deps} -> {key: значение}.
+
+    Записи и версии всех зависимостей читаются одним get_many, а все
+    неактуальные записи compute(keys) считает за один раз - одним запросом
+    вместо запроса на ключ. Блокировки от лавины и stale-while-revalidate
+    нет: пакеты разных запросов почти никогда не совпадают целиком.
+    """
+    dependency_keys = {key: _dependency_keys(deps) for key, deps in deps_by_key.items()}
+    entry_keys = {entry_key(key): key for key in deps_by_key}
+    values = cache.get_many([*entry_keys, *{dep for keys in dependency_keys.values() for dep in keys}])
+
+    result, missing = {}, {}
+    now = time.time()
+    for full_key, key in entry_keys.items():
+        entry = values.get(full_key)
+        versions = _versions(dependency_keys[key], values)
+        if entry is not None and entry['versions'] == versions and entry['fresh_until'] > now:
+            result[key] = entry['value']
+        else:
+            missing[key] = versions
+
+    if missing:
+        computed = compute(list(missing))
+        fresh_until = time.time() + fresh
+        cache.set_many({
+            entry_key(key): {'versions': versions, 'fresh_until': fresh_until, 'value': computed[key]}
+            for key, versions in missing.items()
+        }, stale)
+        result.update(computed)
+    return result
+
+
+def cached(name, deps=(), fresh=FRESH_SECONDS, stale=STALE_SECONDS):
+    """
+    Декоратор для загрузчиков данных представлений.
+
+    Ключ - name и позиционные аргументы функции. deps - модели и строки
+    (Model, pk), от которых зависит результат, или функция, строящая их по
+    тем же аргументам:
+
+        @cached('game_detail', deps=lambda game_id: [(Game, game_id)])
+        def load_game(game_id): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = ':'.join([name, *map(str, args)])
+            dependencies = deps if isinstance(deps, (list, tuple)) else deps(*args)
+            return get_or_compute(key, lambda: func(*args), dependencies, fresh, stale)
+        return wrapper
+    return decorator
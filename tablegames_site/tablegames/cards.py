@@ -0,0 +1,16 @@
+from . import caching
+from .models import Game
+
+
+def attach_versions(games):
+    """
+    Проставляет играм card_version - часть ключа кеша фрагмента карточки.
+
+    Версия карточки - версия строки игры в caching (все версии - одним
+    get_many): ее сбрасывают сигналы при сохранении игры и inventory при
+    списании остатков, после коммита.
+    """
+    games = list(games)
+    for game, version in zip(games, caching.versions([(Game, game.pk) for game in games])):
+        game.card_version = version
+    return games
@@ -0,0 +1,88 @@
+from django.db import models, transaction
+
+from .models import Cart, CartItem, Game
+
+MAX_OPERATIONS = 50
+
+
+class InvalidOperations(ValueError):
+    """Пакет операций с корзиной имеет неверный формат."""
+
+
+def parse_operations(data):
+    """
+    Разбирает {"operations": [{"game_id": 1, "delta": 2}, ...]}.
+
+    Операции над одной игрой складываются; возвращает {game_id: delta}.
+    """
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise InvalidOperations('Нужен непустой список operations')
+    if len(operations) > MAX_OPERATIONS:
+        raise InvalidOperations(f'Не больше {MAX_OPERATIONS} операций за запрос')
+
+    deltas = {}
+    for operation in operations:
+        try:
+            game_id = int(operation['game_id'])
+            delta = int(operation['delta'])
+        except (TypeError, KeyError, ValueError):
+            raise InvalidOperations('Каждая операция - {"game_id": число, "delta": число}')
+        deltas[game_id] = deltas.get(game_id, 0) + delta
+    return deltas
+
+
+def apply_operations(user, deltas):
+    """
+    Применяет изменения количеств к корзине пользователя одной транзакцией.
+
+    Количество ограничивается остатком игры (предупреждение - только если
+    ограничено прибавление), позиции с нулевым количеством удаляются.
+    Запись - не больше одного DELETE, bulk_update, bulk_create и пересчета
+    итогов корзины независимо от числа операций. Возвращает
+    (cart, {game_id: {quantity, item_total}}, предупреждения).
+    """
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        games = Game.objects.only('id', 'name', 'price', 'in_stock').in_bulk(deltas.keys())
+        items = {item.game_id: item for item in CartItem.objects.filter(cart=cart, game_id__in=deltas.keys())}
+
+        to_create, to_update, to_delete = [], [], []
+        result, warnings = {}, []
+        for game_id, delta in deltas.items():
+            game = games.get(game_id)
+            if game is None:
+                warnings.append(f'Игра #{game_id} не найдена')
+                continue
+
+            item = items.get(game_id)
+            current = item.quantity if item else 0
+            quantity = min(max(current + delta, 0), game.in_stock)
+            # Предупреждаем только о прибавлении: уменьшение позиции, которая
+            # больше остатка (остаток упал), молча опускает ее до остатка
+            if delta > 0 and current + delta > quantity:
+                warnings.append(f'Нельзя добавить больше {game.in_stock} шт. товара "{game.name}"')
+
+            if item is None:
+                if quantity:
+                    to_create.append(CartItem(cart=cart, game=game, quantity=quantity, unit_price=game.price))
+            elif not quantity:
+                to_delete.append(item.pk)
+            elif quantity != item.quantity:
+                item.quantity = quantity
+                to_update.append(item)
+            unit_price = item.unit_price if item else game.price
+            result[game_id] = {'quantity': quantity, 'item_total': float(unit_price * quantity)}
+
+        if to_delete:
+            # Базовый QuerySet.delete: итоги пересчитываются ниже одним UPDATE
+            models.QuerySet.delete(CartItem.objects.filter(pk__in=to_delete))
+        if to_update:
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+        if to_create:
+            CartItem.objects.bulk_create(to_create)
+        if to_delete or to_update or to_create:
+            Cart.recalculate_totals(Cart.objects.filter(pk=cart.pk))
+            cart.refresh_from_db(fields=['total_items', 'total_price'])
+
+    return cart, result, warnings
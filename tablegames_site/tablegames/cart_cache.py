@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Cart
+
+SESSION_KEY = 'cart_count'
+
+
+def _version_key(user_id):
+    return f'tablegames:cart_version:{user_id}'
+
+
+def _current_version(user_id):
+    return cache.get(_version_key(user_id), 0)
+
+
+async def _acurrent_version(user_id):
+    return await cache.aget(_version_key(user_id), 0)
+
+
+def bump_version(user_id):
+    """
+    Помечает счетчик пользователя устаревшим во всех его сессиях.
+
+    Версия хранится в кеше Django: при общем кеше (Redis, Memcached) изменение
+    корзины с одного устройства сбрасывает счетчик и на остальных.
+    """
+    key = _version_key(user_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def bump_versions_on_commit(user_ids):
+    """
+    Сбрасывает счетчики пользователей, чьи корзины изменились вне их запросов
+    (удаление игры, смена цены), после коммита: раньше параллельный запрос
+    закешировал бы в сессии старое значение под новой версией.
+    """
+    def bump():
+        for user_id in user_ids:
+            bump_version(user_id)
+
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(bump)
+
+
+async def abump_version(user_id):
+    key = _version_key(user_id)
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, timeout=None)
+        return 1
+
+
+def get_cart_count(request):
+    """Количество товаров в корзине: из сессии, а при смене версии - из Cart.total_items."""
+    user = request.user
+    if not user.is_authenticated:
+        return 0
+
+    version = _current_version(user.pk)
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached.get('user') == user.pk and cached.get('version') == version:
+        return cached['count']
+
+    count = Cart.objects.filter(user=user).values_list('total_items', flat=True).first() or 0
+    request.session[SESSION_KEY] = {'user': user.pk, 'version': version, 'count': count}
+    return count
+
+
+def remember_cart_count(request, count):
+    """Сохраняет новое значение счетчика после изменения корзины в текущем запросе."""
+    version = bump_version(request.user.pk)
+    request.session[SESSION_KEY] = {'user': request.user.pk, 'version': version, 'count': count}
+
+
+async def aget_cart_count(request, user):
+    """Асинхронный вариант get_cart_count; user - результат await request.auser()."""
+    if not user.is_authenticated:
+        return 0
+
+    version = await _acurrent_version(user.pk)
+    cached = await request.session.aget(SESSION_KEY)
+    if cached and cached.get('user') == user.pk and cached.get('version') == version:
+        return cached['count']
+
+    count = await Cart.objects.filter(user=user).values_list('total_items', flat=True).afirst() or 0
+    await request.session.aset(SESSION_KEY, {'user': user.pk, 'version': version, 'count': count})
+    return count
+
+
+async def aremember_cart_count(request, user, count):
+    version = await abump_version(user.pk)
+    await request.session.aset(SESSION_KEY, {'user': user.pk, 'version': version, 'count': count})
+
@@ -0,0 +1,106 @@
+from django.db.models.functions import Left
+
+from . import caching, facets
+from .models import Game, GameTable
+
+PAGE_SIZE = 24
+SHORT_DESCRIPTION_LENGTH = 200
+COUNT_CACHE_TIMEOUT = 60 * 10
+
+# Поля, которые нужны карточке игры в каталоге; полное описание не загружаем
+CARD_FIELDS = (
+    'id', 'name', 'category', 'price', 'rental_price_per_day', 'min_players', 'max_players',
+    'difficulty', 'in_stock', 'available_for_rental', 'image',
+)
+
+
+class CatalogPage:
+    def __init__(self, games, total, has_next, has_previous):
+        self.games = games
+        self.total = total
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    @property
+    def next_cursor(self):
+        return self.games[-1].pk if self.has_next and self.games else None
+
+    @property
+    def previous_cursor(self):
+        return self.games[0].pk if self.has_previous and self.games else None
+
+
+def card_queryset(queryset=None):
+    if queryset is None:
+        queryset = Game.objects.all()
+    return queryset.only(*CARD_FIELDS).annotate(
+        short_description=Left('description', SHORT_DESCRIPTION_LENGTH)
+    )
+
+
+@caching.cached('game_detail', deps=lambda game_id: [(Game, game_id)])
+def load_game(game_id):
+    """Игра для страницы игры (None, если ее нет); сбрасывается при изменении строки."""
+    return Game.objects.filter(id=game_id).first()
+
+
+@caching.cached('active_tables', deps=(GameTable,))
+def active_tables():
+    return list(GameTable.objects.filter(is_active=True))
+
+
+# Остатки меняются массовыми UPDATE без сигналов (inventory) - от них
+# зависят только счетчики фасета «в наличии», а не все списки игр
+STOCK = 'stock'
+STOCK_FACETS = ('in_stock', 'rentable')
+
+
+def invalidate():
+    """Сбрасывает закешированные счетчики каталога после коммита изменения остатков."""
+    caching.invalidate(Game, [STOCK])
+
+
+def filtered_count(filters=None):
+    return caching.get_or_compute(
+        f'catalog_count:{facets.filters_key(filters)}',
+        lambda: facets.filter_games(Game.objects.all(), filters).count(),
+        deps=_count_deps(filters), fresh=COUNT_CACHE_TIMEOUT,
+    )
+
+
+def _count_deps(filters):
+    # Счетчик без фасетов по остаткам не пересчитываем после каждого заказа
+    if any((filters or {}).get(facet) for facet in STOCK_FACETS):
+        return (Game, (Game, STOCK))
+    return (Game,)
+
+
+# Сохранение и удаление игр сбрасывают версию модели Game (сигналы), остатки - STOCK
+facet_counts = caching.cached(
+    'catalog_facets', deps=(Game, (Game, STOCK)), fresh=COUNT_CACHE_TIMEOUT,
+)(facets.compute_facet_counts)
+
+
+def get_page(filters=None, after=None, before=None, page_size=PAGE_SIZE):
+    """
+    Страница каталога с keyset-пагинацией по id.
+
+    after/before - id последней/первой игры соседней страницы. В отличие от
+    OFFSET, стоимость запроса не растет с номером страницы.
+    """
+    games = facets.filter_games(card_queryset(), filters)
+
+    if before is not None:
+        rows = list(games.filter(pk__lt=before).order_by('-pk')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            games = games.filter(pk__gt=after)
+        rows = list(games.order_by('pk')[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+
+    return CatalogPage(rows, filtered_count(filters), has_next, has_previous)
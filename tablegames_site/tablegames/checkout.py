@@ -0,0 +1,44 @@
+from django.db import transaction
+
+from . import inventory, jobs
+from .models import OrderItem, PurchaseOrder
+
+
+class EmptyCart(Exception):
+    """В корзине нет товаров."""
+
+
+def place_order(cart, customer):
+    """
+    Оформляет заказ из корзины за постоянное число запросов.
+
+    Позиции читаются в той же транзакции, что и очистка корзины: иначе
+    товар, добавленный между чтением и очисткой, удалился бы без заказа.
+    Дальше идут проверка и списание остатков одним условным UPDATE, вставка
+    заказа, один bulk_create позиций и очистка корзины, поэтому блокировка
+    записи SQLite держится одинаковое время при любом размере корзины.
+    """
+    with transaction.atomic():
+        # В SQLite транзакция и так начинается с BEGIN IMMEDIATE; на других СУБД блокируем позиции
+        items = list(
+            cart.items.select_for_update(of=('self',)).select_related('game').only('game', 'quantity', 'game__price')
+        )
+        if not items:
+            raise EmptyCart('Корзина пуста')
+
+        # Не хватает остатка - InsufficientStock, ничего не списано
+        inventory.reserve((item.game_id, item.quantity) for item in items)
+
+        order = PurchaseOrder.objects.create(
+            customer=customer,
+            total_amount=sum(item.game.price * item.quantity for item in items),
+            shipping_address=customer.address,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, game_id=item.game_id, quantity=item.quantity, price=item.game.price)
+            for item in items
+        ])
+        cart.clear()
+        # Письмо - после коммита и вне запроса
+        jobs.enqueue('send_order_confirmation', {'order_id': order.pk})
+    return order
@@ -0,0 +1,107 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Count, Max
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from . import catalog
+from .cart_cache import get_cart_count
+from .models import Game, GameTable
+
+
+def _state(request, model):
+    """
+    (max(updated_at), количество) модели одним запросом по индексу updated_at.
+
+    Количество ловит удаления. Результат запоминается на запросе: его
+    используют и ETag, и Last-Modified.
+    """
+    states = request.__dict__.setdefault('_conditional_states', {})
+    if model not in states:
+        state = model.objects.aggregate(updated=Max('updated_at'), count=Count('pk'))
+        states[model] = (state['updated'], state['count'])
+    return states[model]
+
+
+def _viewer(request):
+    """
+    Части страницы, зависящие не от каталога, а от пользователя: шапка
+    с именем и счетчиком корзины, кнопки покупки.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    return f'{user.pk}:{user.get_username()}:{user.first_name}:{get_cart_count(request)}'
+
+
+def _uncacheable(request):
+    # Флеш-сообщение должно показаться в этом ответе, а не потеряться за 304
+    return len(get_messages(request)) > 0
+
+
+def _etag(request, *parts):
+    source = ':'.join(map(str, (getattr(settings, 'TABLEGAMES_RELEASE', ''), _viewer(request), *parts)))
+    return hashlib.md5(source.encode()).hexdigest()
+
+
+def _last_modified(request, updated):
+    # Last-Modified не знает о пользователе - отдаем его только анонимным
+    return None if request.user.is_authenticated else updated
+
+
+def game_list_etag(request):
+    if _uncacheable(request):
+        return None
+    # Фасеты и счетчики зависят от всего каталога, поэтому состояние - по всем играм
+    return _etag(request, *_state(request, Game))
+
+
+def game_list_last_modified(request):
+    if _uncacheable(request):
+        return None
+    return _last_modified(request, _state(request, Game)[0])
+
+
+def game_detail_etag(request, game_id):
+    game = catalog.load_game(game_id)
+    if game is None or _uncacheable(request):
+        return None
+    return _etag(request, game.pk, game.updated_at.isoformat())
+
+
+def game_detail_last_modified(request, game_id):
+    game = catalog.load_game(game_id)
+    if game is None or _uncacheable(request):
+        return None
+    return _last_modified(request, game.updated_at)
+
+
+def table_list_etag(request):
+    # С фильтром по времени список зависит от броней - такие ответы не кешируем
+    if request.GET or _uncacheable(request):
+        return None
+    return _etag(request, *_state(request, GameTable))
+
+
+def table_list_last_modified(request):
+    if request.GET or _uncacheable(request):
+        return None
+    return _last_modified(request, _state(request, GameTable)[0])
+
+
+def _conditional(etag_func, last_modified_func):
+    """
+    Условный GET (304 по If-None-Match / If-Modified-Since). no-cache: браузер
+    и прокси хранят страницу, но каждый раз перепроверяют ее у нас.
+    """
+    def decorator(view):
+        view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        return cache_control(no_cache=True)(view)
+    return decorator
+
+
+game_list = _conditional(game_list_etag, game_list_last_modified)
+game_detail = _conditional(game_detail_etag, game_detail_last_modified)
+table_list = _conditional(table_list_etag, table_list_last_modified)
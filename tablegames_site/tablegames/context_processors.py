@@ -0,0 +1,6 @@
+from .cart_cache import get_cart_count
+
+
+def cart(request):
+    # Счетчик для значка корзины в навбаре; ленивый, чтобы не трогать сессию без нужды
+    return {'cart_count': lambda: get_cart_count(request)}
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Режим журнала хранится в самом файле базы: его включает пишущее соединение
+# и только при TABLEGAMES_SQLITE_WAL. Соединения только для чтения (NAME с
+# ?mode=ro) его не меняют, а без настройки не меняется и файл разработки
+# db.sqlite3 из репозитория
+PERSISTENT_PRAGMAS = ('journal_mode',)
+
+
+def is_read_only(connection):
+    return str(connection.settings_dict['NAME']).endswith('mode=ro')
+
+
+def sqlite_pragmas():
+    return getattr(settings, 'TABLEGAMES_SQLITE_PRAGMAS', {})
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Настраивает каждое новое соединение SQLite (WAL, synchronous, mmap...).
+
+    PRAGMA выполняются на сыром соединении sqlite3, мимо execute_wrapper:
+    они не попадают в счетчики запросов QueryStatsMiddleware и тестов.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    persistent = getattr(settings, 'TABLEGAMES_SQLITE_WAL', False) and not is_read_only(connection)
+    for name, value in sqlite_pragmas().items():
+        if name in PERSISTENT_PRAGMAS and not persistent:
+            continue
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,85 @@
+from django.db.models import Count, Q
+
+from .models import Game
+
+PRICE_BANDS = [
+    ('0-1500', 'до 1500 руб.', None, 1500),
+    ('1500-3000', '1500-3000 руб.', 1500, 3000),
+    ('3000-6000', '3000-6000 руб.', 3000, 6000),
+    ('6000-', 'от 6000 руб.', 6000, None),
+]
+
+PLAY_TIME_BANDS = [
+    ('0-30', 'до 30 минут', None, 30),
+    ('30-60', '30-60 минут', 30, 60),
+    ('60-120', '1-2 часа', 60, 120),
+    ('120-', 'больше 2 часов', 120, None),
+]
+
+PLAYER_COUNTS = range(1, 9)
+DIFFICULTIES = range(1, 6)
+
+
+def _band_q(field, bands, key):
+    for band_key, label, low, high in bands:
+        if band_key == key:
+            q = Q()
+            if low is not None:
+                q &= Q(**{f'{field}__gte': low})
+            if high is not None:
+                q &= Q(**{f'{field}__lt': high})
+            return q
+    return Q()
+
+
+def _facet_conditions():
+    """Пары (facet, значение) -> условие; из них строятся и фильтры, и счетчики."""
+    conditions = {}
+    for key, label in Game.GAME_CATEGORIES:
+        conditions['category', key] = Q(category=key)
+    for players in PLAYER_COUNTS:
+        # Игра подходит, если число игроков попадает в диапазон [min_players, max_players]
+        conditions['players', players] = Q(min_players__lte=players, max_players__gte=players)
+    for difficulty in DIFFICULTIES:
+        conditions['difficulty', difficulty] = Q(difficulty=difficulty)
+    for key, label, low, high in PRICE_BANDS:
+        conditions['price', key] = _band_q('price', PRICE_BANDS, key)
+    for key, label, low, high in PLAY_TIME_BANDS:
+        conditions['play_time', key] = _band_q('play_time_minutes', PLAY_TIME_BANDS, key)
+    conditions['in_stock', True] = Q(in_stock__gt=0)
+    conditions['rentable', True] = Q(available_for_rental__gt=0)
+    return conditions
+
+
+def filter_games(queryset, filters):
+    """Применяет выбранные фасеты (cleaned_data GameFilterForm) к queryset."""
+    conditions = _facet_conditions()
+    for facet, value in (filters or {}).items():
+        if value not in (None, '', False):
+            queryset = queryset.filter(conditions[facet, value])
+    return queryset
+
+
+def filters_key(filters):
+    return '&'.join(
+        f'{facet}={value}' for facet, value in sorted((filters or {}).items())
+        if value not in (None, '', False)
+    ) or 'all'
+
+
+def compute_facet_counts():
+    """
+    Счетчики по всем значениям всех фасетов одним агрегирующим запросом.
+
+    Возвращает {facet: {значение: количество}} плюс общее число игр в 'total'.
+    """
+    conditions = _facet_conditions()
+    aliases = {f'facet_{index}': key for index, key in enumerate(conditions)}
+    row = Game.objects.aggregate(
+        total=Count('pk'),
+        **{alias: Count('pk', filter=conditions[key]) for alias, key in aliases.items()}
+    )
+    counts = {'total': row['total']}
+    for alias, (facet, value) in aliases.items():
+        counts.setdefault(facet, {})[value] = row[alias]
+    return counts
@@ -3,7 +3,10 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from .models import TableBooking, GameRental, PurchaseOrder, Customer
+from .models import Game, TableBooking, GameRental, PurchaseOrder, Customer
+from .availability import is_table_free
+from .rentals import max_free
+from . import facets
 from django.utils import timezone
 import datetime
 
@@ -99,13 +102,7 @@ class TableBookingForm(forms.ModelForm):
             if start_time >= end_time:
                 raise ValidationError('Время окончания должно быть позже времени начала')
 
-            if TableBooking.objects.filter(
-                    table=table,
-                    booking_date=booking_date,
-                    start_time__lt=end_time,
-                    end_time__gt=start_time,
-                    status__in=['pending', 'confirmed']
-            ).exists():
+            if table and not is_table_free(table, booking_date, start_time, end_time):
                 raise ValidationError('Этот столик уже забронирован на выбранное время')
 
         if number_of_people and table:
@@ -115,6 +112,97 @@ class TableBookingForm(forms.ModelForm):
         return cleaned_data
 
 
+class TableAvailabilityForm(forms.Form):
+    booking_date = forms.DateField(
+        label='Дата',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    start_time = forms.TimeField(
+        label='Начало',
+        widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
+    )
+    end_time = forms.TimeField(
+        label='Окончание',
+        widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
+    )
+    number_of_people = forms.IntegerField(
+        label='Количество человек',
+        required=False,
+        min_value=1,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'min': 1})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_time = cleaned_data.get('start_time')
+        end_time = cleaned_data.get('end_time')
+
+        if start_time and end_time and start_time >= end_time:
+            raise ValidationError('Время окончания должно быть позже времени начала')
+
+        return cleaned_data
+
+
+class GameFilterForm(forms.Form):
+    category = forms.ChoiceField(
+        label='Категория',
+        required=False,
+        choices=[('', 'Все категории')] + Game.GAME_CATEGORIES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    players = forms.TypedChoiceField(
+        label='Количество игроков',
+        required=False,
+        coerce=int,
+        empty_value=None,
+        choices=[('', 'Любое')] + [(count, count) for count in facets.PLAYER_COUNTS],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    play_time = forms.ChoiceField(
+        label='Время игры',
+        required=False,
+        choices=[('', 'Любое')] + [(key, label) for key, label, low, high in facets.PLAY_TIME_BANDS],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    difficulty = forms.TypedChoiceField(
+        label='Сложность',
+        required=False,
+        coerce=int,
+        empty_value=None,
+        choices=[('', 'Любая')] + [(level, f'{level}/5') for level in facets.DIFFICULTIES],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    price = forms.ChoiceField(
+        label='Цена',
+        required=False,
+        choices=[('', 'Любая')] + [(key, label) for key, label, low, high in facets.PRICE_BANDS],
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    in_stock = forms.BooleanField(
+        label='В наличии',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    rentable = forms.BooleanField(
+        label='Доступна для аренды',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+    def __init__(self, *args, facet_counts=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if facet_counts:
+            # Подписываем варианты количеством игр из закешированных счетчиков
+            for name in ['category', 'players', 'play_time', 'difficulty', 'price']:
+                field = self.fields[name]
+                field.choices = [
+                    (value, f'{label} ({facet_counts[name][value]})' if value != '' else label)
+                    for value, label in field.choices
+                ]
+            for name in ['in_stock', 'rentable']:
+                self.fields[name].label = f'{self.fields[name].label} ({facet_counts[name][True]})'
+
+
 class GameRentalForm(forms.ModelForm):
     class Meta:
         model = GameRental
@@ -144,9 +232,10 @@ class GameRentalForm(forms.ModelForm):
             if rental_days > 30:
                 raise ValidationError('Максимальный срок аренды - 30 дней')
 
-        if game and quantity:
-            if quantity > game.available_for_rental:
-                raise ValidationError(f'Доступно для аренды только {game.available_for_rental} экземпляров')
+        if game and quantity and rental_start_date and rental_end_date:
+            free = max_free(game, rental_start_date, rental_end_date)
+            if quantity > free:
+                raise ValidationError(f'На выбранные даты доступно для аренды только {free} экземпляров')
 
         return cleaned_data
 
@@ -0,0 +1,20 @@
+from . import caching
+from .models import Game, GameTable
+
+FEATURED_GAMES = 6
+# Списание остатков при заказах снимок не сбрасывает (caching.invalidate только
+# по строкам игр): карусель не показывает остатки, а игра, закончившаяся на
+# складе, уйдет из нее за FRESH_SECONDS
+FRESH_SECONDS = 60
+
+
+def build():
+    """Собирает данные главной страницы: карусель игр в наличии и активные столики."""
+    return {
+        'games': list(Game.objects.filter(in_stock__gt=0)[:FEATURED_GAMES]),
+        'tables': list(GameTable.objects.filter(is_active=True)),
+    }
+
+
+# Снимок главной: без запросов к базе, пока он свежий и игры/столики не менялись
+get_snapshot = caching.cached('homepage', deps=(Game, GameTable), fresh=FRESH_SECONDS)(build)
@@ -0,0 +1,233 @@
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger('tablegames.stats')
+
+RESERVOIR_SIZE = 512
+PERCENTILES = (50, 95, 99)
+
+# Контекстная переменная, а не threading.local: при ASGI запросы делят поток
+_current_record = ContextVar('tablegames_request_record', default=None)
+
+
+class Reservoir:
+    """Равномерная выборка фиксированного размера из потока значений (Algorithm R)."""
+
+    def __init__(self, size=RESERVOIR_SIZE):
+        self.size = size
+        self.seen = 0
+        self.values = []
+
+    def add(self, value):
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            index = random.randrange(self.seen)
+            if index < self.size:
+                self.values[index] = value
+
+    def percentiles(self, points=PERCENTILES):
+        if not self.values:
+            return {}
+        ordered = sorted(self.values)
+        return {
+            f'p{point}': ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))]
+            for point in points
+        }
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.slowest_sql_ms = 0.0
+        self.slowest_sql = ''
+        self.total_ms = Reservoir()
+        self.query_counts = Reservoir()
+
+    def add(self, record):
+        self.requests += 1
+        self.queries += record.queries
+        self.sql_ms += record.sql_ms
+        if record.slowest_sql_ms > self.slowest_sql_ms:
+            self.slowest_sql_ms = record.slowest_sql_ms
+            self.slowest_sql = record.slowest_sql
+        self.total_ms.add(record.total_ms)
+        self.query_counts.add(record.queries)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 2) if self.requests else 0,
+            'avg_sql_ms': round(self.sql_ms / self.requests, 2) if self.requests else 0,
+            'slowest_sql_ms': round(self.slowest_sql_ms, 2),
+            'slowest_sql': self.slowest_sql,
+            'total_ms': {key: round(value, 2) for key, value in self.total_ms.percentiles().items()},
+            'queries': self.query_counts.percentiles(),
+        }
+
+
+class StatsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def add(self, name, record):
+        with self._lock:
+            self._endpoints.setdefault(name, EndpointStats()).add(record)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in sorted(self._endpoints.items())}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = StatsRegistry()
+
+
+class RequestRecord:
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.slowest_sql_ms = 0.0
+        self.slowest_sql = ''
+        self.template_ms = 0.0
+        self.view_ms = 0.0
+        self.total_ms = 0.0
+        self.started = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обертка connection.execute_wrapper: работает и при DEBUG=False
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.sql_ms += elapsed
+            if elapsed > self.slowest_sql_ms:
+                self.slowest_sql_ms = elapsed
+                self.slowest_sql = sql[:500]
+
+    def header(self):
+        return (
+            f'queries={self.queries}; sql={self.sql_ms:.1f}ms; slowest={self.slowest_sql_ms:.1f}ms; '
+            f'template={self.template_ms:.1f}ms; view={self.view_ms:.1f}ms; total={self.total_ms:.1f}ms'
+        )
+
+
+class TimedTemplate(django_backend.Template):
+    """Шаблон, добавляющий время рендера к статистике текущего запроса."""
+
+    def render(self, context=None, request=None):
+        record = _current_record.get()
+        if record is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record.template_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedDjangoTemplates(django_backend.DjangoTemplates):
+    """
+    Бэкенд DjangoTemplates с замером времени шаблонов (TEMPLATES['BACKEND']).
+
+    Замер ограничен шаблонами этого бэкенда: класс Template самого Django
+    не подменяется, и другие движки и тесты его не замечают.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class QueryStatsMiddleware:
+    """
+    Считает запросы к БД, время SQL, шаблонов и представления для каждого запроса.
+
+    Статистика копится по имени URL в ограниченных выборках. При
+    TABLEGAMES_QUERY_STATS_HEADER (по умолчанию равен DEBUG) итог запроса
+    добавляется в заголовок X-Query-Stats. Middleware стоит последним в
+    MIDDLEWARE, чтобы process_view вызывался прямо перед представлением.
+    Время шаблонов считается, если в TEMPLATES подключен TimedDjangoTemplates.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.add_header = getattr(settings, 'TABLEGAMES_QUERY_STATS_HEADER', settings.DEBUG)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # Иначе Django обернет process_view в sync_to_async - лишний переход в поток
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record, token, stack = self._start()
+        try:
+            with stack:
+                response = self.get_response(request)
+        finally:
+            _current_record.reset(token)
+        return self._finish(request, response, record)
+
+    async def __acall__(self, request):
+        record, token, stack = self._start()
+        try:
+            with stack:
+                response = await self.get_response(request)
+        finally:
+            _current_record.reset(token)
+        return self._finish(request, response, record)
+
+    def _start(self):
+        record = RequestRecord()
+        record.started = time.perf_counter()
+        token = _current_record.set(record)
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(record))
+        return record, token, stack
+
+    def _finish(self, request, response, record):
+        finished = time.perf_counter()
+        record.total_ms = (finished - record.started) * 1000
+        view_started = getattr(request, '_stats_view_started', None)
+        if view_started is not None:
+            record.view_ms = (finished - view_started) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        name = (match.url_name if match else None) or 'unresolved'
+        registry.add(name, record)
+
+        if self.add_header:
+            response['X-Query-Stats'] = record.header()
+        logger.debug('%s %s %s', request.method, name, record.header())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._stats_view_started = time.perf_counter()
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        request._stats_view_started = time.perf_counter()
@@ -0,0 +1,98 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from . import caching, catalog
+from .models import Game
+
+IN_STOCK = 'in_stock'
+
+
+class InsufficientStock(Exception):
+    """Не хватает экземпляров игры для резервирования."""
+
+    def __init__(self, game, requested, field=IN_STOCK):
+        self.game = game
+        self.requested = requested
+        self.field = field
+        super().__init__(f'Товар "{game.name}" недоступен в количестве {requested} шт.')
+
+
+class _Shortage(Exception):
+    pass
+
+
+def _normalize(quantities):
+    # Складываем повторы одной игры и отбрасываем нулевые позиции
+    if isinstance(quantities, dict):
+        quantities = quantities.items()
+    merged = {}
+    for game_id, quantity in quantities:
+        game_id = getattr(game_id, 'pk', game_id)
+        if quantity:
+            merged[game_id] = merged.get(game_id, 0) + quantity
+    return merged
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=game_id, then=Value(quantity)) for game_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+async def aavailable(game_id, field=IN_STOCK):
+    """Текущий остаток игры из базы для async-представлений корзины (0, если игры нет)."""
+    return await Game.objects.filter(pk=game_id).values_list(field, flat=True).afirst() or 0
+
+
+def reserve(quantities, field=IN_STOCK):
+    """
+    Атомарно списывает остатки по нескольким играм одним UPDATE.
+
+    quantities - словарь или пары (game_id | Game, количество). Списание
+    выполняется только если для каждой игры остатка хватает; иначе ничего
+    не меняется и выбрасывается InsufficientStock. Фиксация резерва - это
+    коммит внешней transaction.atomic().
+    """
+    quantities = _normalize(quantities)
+    if not quantities:
+        return
+
+    needed = _quantity_case(quantities)
+    try:
+        with transaction.atomic():
+            updated = Game.objects.filter(
+                pk__in=quantities.keys(),
+                **{f'{field}__gte': needed},
+            ).update(**{field: F(field) - needed}, updated_at=timezone.now())
+            if updated != len(quantities):
+                # Откатываем точку сохранения, чтобы не списать часть корзины
+                raise _Shortage
+        # Остатки видны на карточках, страницах игр и в фасете «в наличии» - сбрасываем их кеш
+        caching.invalidate(Game, quantities.keys())
+        catalog.invalidate()
+    except _Shortage:
+        games = {game.pk: game for game in Game.objects.filter(pk__in=quantities.keys()).only('id', 'name', field)}
+        for game_id, quantity in quantities.items():
+            if game_id not in games:
+                raise Game.DoesNotExist(f'Игра #{game_id} не найдена')
+            if getattr(games[game_id], field) < quantity:
+                raise InsufficientStock(games[game_id], quantity, field)
+        # Остаток успели вернуть между UPDATE и проверкой - считаем это конфликтом
+        game_id, quantity = next(iter(quantities.items()))
+        raise InsufficientStock(games[game_id], quantity, field)
+
+
+def release(quantities, field=IN_STOCK):
+    """Возвращает зарезервированные экземпляры на склад одним UPDATE."""
+    quantities = _normalize(quantities)
+    if not quantities:
+        return
+
+    Game.objects.filter(pk__in=quantities.keys()).update(
+        **{field: F(field) + _quantity_case(quantities)}, updated_at=timezone.now(),
+    )
+    caching.invalidate(Game, quantities.keys())
+    catalog.invalidate()
+
@@ -0,0 +1,143 @@
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('tablegames.jobs')
+
+DEFAULT_MAX_ATTEMPTS = 5
+BATCH_SIZE = 10
+LEASE_SECONDS = 5 * 60
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+
+TASKS = {}
+
+
+def task(name):
+    """
+    Регистрирует обработчик задачи.
+
+    Доставка - "хотя бы один раз": задача, упавшая или брошенная
+    обработчиком, выполняется повторно, поэтому обработчики должны быть
+    идемпотентными.
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Ставит задачу в очередь после коммита текущей транзакции.
+
+    Если транзакцию откатят, задача не появится; вне транзакции она
+    создается сразу.
+    """
+    if name not in TASKS:
+        raise LookupError(f'Неизвестная задача "{name}"')
+
+    def create():
+        Job.objects.create(
+            task=name,
+            payload=payload or {},
+            max_attempts=max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+    transaction.on_commit(create)
+
+
+def backoff(attempt):
+    """Задержка перед повтором: экспонента от номера попытки со случайной добавкой."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    return delay * (1 + random.random() / 2)
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit=BATCH_SIZE, lease=LEASE_SECONDS):
+    """
+    Забирает до limit готовых задач для worker.
+
+    Готовы задачи в очереди с наступившим run_at и задачи, чей обработчик
+    не отчитался за lease секунд (упал вместе с процессом). Каждая задача
+    захватывается условным UPDATE, поэтому параллельные обработчики не
+    возьмут одну задачу дважды.
+    """
+    now = timezone.now()
+    expired = Q(status='running', locked_at__lt=now - timedelta(seconds=lease))
+
+    # Брошенные задачи без оставшихся попыток больше не запускаем
+    Job.objects.filter(expired, attempts__gte=F('max_attempts')).update(
+        status='failed', last_error='Обработчик не завершил задачу', finished_at=now, locked_at=None,
+    )
+
+    ready = Job.objects.filter(Q(status='queued', run_at__lte=now) | expired).order_by('run_at', 'pk')
+    claimed = []
+    for pk, status, locked_at in ready.values_list('pk', 'status', 'locked_at')[:limit]:
+        if Job.objects.filter(pk=pk, status=status, locked_at=locked_at).update(
+            status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        ):
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'pk'))
+
+
+def run(job):
+    """Выполняет захваченную задачу и записывает результат; возвращает True при успехе."""
+    # Отчитываемся, только если задачу не перехватили после истечения аренды
+    mine = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by, locked_at=job.locked_at)
+    now = timezone.now
+
+    try:
+        handler = TASKS.get(job.task)
+        if handler is None:
+            raise LookupError(f'Неизвестная задача "{job.task}"')
+        handler(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error('Задача %s #%s не выполнена: %s', job.task, job.pk, error)
+            mine.update(status='failed', last_error=error, finished_at=now(), locked_at=None)
+        else:
+            logger.warning('Задача %s #%s, попытка %s: %s', job.task, job.pk, job.attempts, error)
+            mine.update(
+                status='queued', last_error=error, locked_by='', locked_at=None,
+                run_at=now() + timedelta(seconds=backoff(job.attempts)),
+            )
+        return False
+
+    mine.update(status='done', finished_at=now(), locked_at=None)
+    return True
+
+
+def work(worker=None, once=False, batch=BATCH_SIZE, idle_sleep=1.0):
+    """
+    Цикл обработчика. С once=True обрабатывает все готовые задачи и
+    возвращает их количество.
+    """
+    worker = worker or default_worker_name()
+    processed = 0
+    while True:
+        if not connection.in_atomic_block:
+            # Долгоживущий процесс: переподключаемся после обрыва или CONN_MAX_AGE
+            close_old_connections()
+        jobs = claim(worker, batch)
+        for job in jobs:
+            run(job)
+            processed += 1
+        if not jobs:
+            if once:
+                return processed
+            time.sleep(idle_sleep)
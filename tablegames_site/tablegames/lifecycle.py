@@ -0,0 +1,106 @@
+import time
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import availability, caching, rentals
+from .models import GameRental, TableBooking
+
+BATCH_SIZE = 500
+
+# (исходный статус, новый статус): прошедшие брони и вернувшиеся аренды
+# завершаются. Сайт создает их в статусе pending и не подтверждает, поэтому
+# pending тоже завершается, а не отменяется - иначе в профиле любая прошедшая
+# бронь выглядела бы отмененной
+BOOKING_TRANSITIONS = (('confirmed', 'completed'), ('pending', 'completed'))
+RENTAL_TRANSITIONS = (('active', 'completed'), ('pending', 'completed'))
+
+
+class SweepProgress:
+    """Счетчик переходов одного вида для вывода прогресса."""
+
+    def __init__(self, label):
+        self.label = label
+        self.updated = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.updated / self.elapsed if self.elapsed else 0.0
+
+
+def expired_bookings(now=None):
+    """Брони, время которых уже закончилось."""
+    now = timezone.localtime(now)
+    return TableBooking.objects.filter(
+        Q(booking_date__lt=now.date()) | Q(booking_date=now.date(), end_time__lte=now.time())
+    )
+
+
+def expired_rentals(now=None):
+    """Аренды, срок которых истек: в день возврата экземпляр уже свободен."""
+    return GameRental.objects.filter(rental_end_date__lte=timezone.localdate(now))
+
+
+def _sweep(queryset, fields, source, target, batch, progress, on_batch, on_updated):
+    """
+    Переводит строки queryset из source в target пачками по batch.
+
+    Каждая пачка - отдельная короткая транзакция: выборка ключей и UPDATE с
+    повторным условием на исходный статус. Параллельный запуск безопасен:
+    строки, которые уже перевел другой процесс, просто не попадут под UPDATE.
+    """
+    queryset = queryset.filter(status=source).order_by('pk')
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.values_list('pk', *fields)[:batch])
+            if not rows:
+                return progress
+            updated = queryset.model.objects.filter(
+                pk__in=[row[0] for row in rows], status=source,
+            ).update(status=target)
+        # bulk UPDATE минует сигналы - сбрасываем зависимые кеши сами
+        on_updated(rows)
+        caching.invalidate(queryset.model)
+        progress.updated += updated
+        progress.batches += 1
+        if on_batch:
+            on_batch(progress)
+
+
+def _invalidate_grids(rows):
+    for table_id, booking_date in {row[1:] for row in rows}:
+        availability.invalidate_grid(table_id, booking_date)
+
+
+def _invalidate_occupancy(rows):
+    # Склад не восстанавливается: available_for_rental - общий запас, а
+    # занятость считается по датам. Достаточно сбросить кеш занятости игр.
+    for game_id in {row[1] for row in rows}:
+        rentals.invalidate(game_id)
+
+
+def sweep_bookings(now=None, batch=BATCH_SIZE, on_batch=None):
+    """Завершает прошедшие брони столиков; возвращает SweepProgress по переходам."""
+    queryset = expired_bookings(now)
+    return [
+        _sweep(queryset, ('table_id', 'booking_date'), source, target, batch,
+               SweepProgress(f'Брони {source} -> {target}'), on_batch, _invalidate_grids)
+        for source, target in BOOKING_TRANSITIONS
+    ]
+
+
+def sweep_rentals(now=None, batch=BATCH_SIZE, on_batch=None):
+    """Завершает истекшие аренды игр; возвращает SweepProgress по переходам."""
+    queryset = expired_rentals(now)
+    return [
+        _sweep(queryset, ('game_id',), source, target, batch,
+               SweepProgress(f'Аренды {source} -> {target}'), on_batch, _invalidate_occupancy)
+        for source, target in RENTAL_TRANSITIONS
+    ]
@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from tablegames import benchmark, cards, views
+from tablegames.models import Game
+
+# Фрагменты {% cache %} из includes/game_card.html
+CARD_FRAGMENTS = ('game_card', 'game_card_stock')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время рендера index и game_list без кеша карточек и с ним '
+        'на синтетических данных в отдельной тестовой базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--games', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def fragment_keys(self):
+        # Общий кеш (Redis) не очищается целиком: удаляются только фрагменты
+        # карточек, счетчики версий caching и остальные кеши остаются
+        return [
+            make_template_fragment_key(fragment, [game.id, game.card_version])
+            for game in cards.attach_versions(Game.objects.only('id'))
+            for fragment in CARD_FRAGMENTS
+        ]
+
+    def measure(self, view, path, iterations, warm):
+        request_factory = RequestFactory()
+        keys = [] if warm else self.fragment_keys()
+        timings = []
+        for _ in range(iterations):
+            if keys:
+                cache.delete_many(keys)
+            request = request_factory.get(path)
+            request.user = AnonymousUser()
+            request.session = {}
+            started = time.perf_counter()
+            view(request)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        with benchmark.test_database():
+            benchmark.seed(
+                games=options['games'], users=1, tables=1,
+                bookings=0, rentals=0, orders=0, random_seed=options['seed'],
+            )
+            for name, view, path in [('index', views.index, '/'), ('game_list', views.game_list, '/games/')]:
+                # Прогрев: первый рендер компилирует шаблоны и заполняет кеши
+                # каталога, так что холодный замер отличается только карточками
+                self.measure(view, path, 1, warm=False)
+                cold = self.measure(view, path, iterations, warm=False)
+                self.measure(view, path, 1, warm=True)
+                warm = self.measure(view, path, iterations, warm=True)
+                self.stdout.write(
+                    f'{name}: без кеша карточек {cold:.2f} мс, с кешем карточек {warm:.2f} мс '
+                    f'(x{cold / warm if warm else 0:.1f})'
+                )
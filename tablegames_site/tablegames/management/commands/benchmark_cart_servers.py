@@ -0,0 +1,44 @@
+import logging
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from tablegames import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность JSON-эндпоинтов корзины под WSGI '
+        '(поток на покупателя) и ASGI (корутины в одном цикле событий)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=50, help='Число одновременных покупателей')
+        parser.add_argument('--requests', type=int, default=30, help='Запросов на покупателя')
+        parser.add_argument('--games', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency должен быть положительным')
+
+        # Ошибки блокировок SQLite под WSGI попадают в сводку; трассировки
+        # django.request в выводе замера не нужны
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        with benchmark.test_database():
+            cache.clear()
+            benchmark.seed(
+                games=options['games'], users=options['concurrency'], tables=1,
+                bookings=0, rentals=0, orders=0, random_seed=options['seed'],
+            )
+            results = benchmark.CartServerBenchmark(
+                concurrency=options['concurrency'], requests_per_user=options['requests'],
+                random_seed=options['seed'],
+            ).run()
+
+        self.stdout.write(f'{"сервер":<8}{"запросов":>10}{"ошибок":>8}{"запр./с":>10}{"p50":>10}{"p95":>10}{"p99":>10}')
+        for server, row in results.items():
+            self.stdout.write(
+                f'{server:<8}{row["requests"]:>10}{row["errors"]:>8}{row["throughput_rps"]:>10}'
+                f'{row["p50_ms"]:>10}{row["p95_ms"]:>10}{row["p99_ms"]:>10}'
+            )
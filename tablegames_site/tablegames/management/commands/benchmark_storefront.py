@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from tablegames import benchmark
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'storefront_baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон витрины и оформления заказа на синтетических данных '
+        'в отдельной тестовой базе; сравнивает число запросов (и по --tolerance - p95) с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--tables', type=int, default=30)
+        parser.add_argument('--bookings', type=int, default=20000)
+        parser.add_argument('--rentals', type=int, default=20000)
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--iterations', type=int, default=100, help='Число полных сценариев покупателя')
+        parser.add_argument('--concurrency', type=int, default=1, help='Число одновременных покупателей')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--write-baseline', action='store_true', help='Сохранить результат как базовую линию')
+        parser.add_argument(
+            '--tolerance', type=float, default=None,
+            help='Допустимый рост p95 (доля, например 0.25). Без флага задержки не сравниваются: '
+                 'базовая линия зависит от машины, на которой ее записали',
+        )
+        parser.add_argument('--query-tolerance', type=float, default=1, help='Допустимый рост среднего числа запросов')
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после прогона')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] > options['users']:
+            raise CommandError('--concurrency не может быть больше --users')
+
+        with benchmark.test_database(keepdb=options['keepdb']):
+            cache.clear()
+            counts = benchmark.seed(
+                games=options['games'], users=options['users'], tables=options['tables'],
+                bookings=options['bookings'], rentals=options['rentals'], orders=options['orders'],
+                random_seed=options['seed'],
+            )
+            self.stdout.write('Данные: ' + ', '.join(f'{name}={count}' for name, count in counts.items()))
+
+            report = benchmark.StorefrontBenchmark(
+                iterations=options['iterations'], concurrency=options['concurrency'], random_seed=options['seed'],
+            ).run()
+
+        self.print_report(report)
+
+        baseline_path = Path(options['baseline'])
+        if options['write_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(f'Базовая линия записана в {baseline_path}')
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(f'Базовая линия {baseline_path} не найдена, сравнение пропущено')
+            return
+        regressions = benchmark.compare(
+            report, json.loads(baseline_path.read_text()),
+            tolerance=options['tolerance'], query_tolerance=options['query_tolerance'],
+        )
+        if regressions:
+            raise CommandError('Регрессии производительности:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий относительно базовой линии нет'))
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{report["iterations"]} сценариев, {report["concurrency"]} поток(ов), '
+            f'{report["elapsed_s"]} с, {report["throughput_rps"]} запросов/с'
+        )
+        self.stdout.write(f'{"сценарий":<24}{"n":>6}{"ошибок":>8}{"p50":>10}{"p95":>10}{"p99":>10}{"запросов":>10}')
+        for name, row in report['scenarios'].items():
+            self.stdout.write(
+                f'{name:<24}{row["requests"]:>6}{row["errors"]:>8}{row["p50_ms"]:>10}'
+                f'{row["p95_ms"]:>10}{row["p99_ms"]:>10}{row["avg_queries"]:>10}'
+            )
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tablegames import search
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает поисковый индекс по названиям и описаниям игр'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько записей индекса вставлять за один запрос')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        indexed = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано игр: {indexed} за {time.monotonic() - started:.1f} с'
+        ))
@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Sum
+
+from tablegames.models import Cart, CartItem
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и проверяет сохраненные итоги корзин (количество и сумму)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только проверить итоги, ничего не изменяя')
+
+    def handle(self, *args, **options):
+        actual = {
+            row['cart_id']: (row['items'], row['amount'])
+            for row in CartItem.objects.order_by().values('cart_id').annotate(
+                items=Sum('quantity'),
+                amount=Sum(F('quantity') * F('unit_price')),
+            )
+        }
+        mismatched = [
+            cart_id
+            for cart_id, total_items, total_price in Cart.objects.values_list('id', 'total_items', 'total_price')
+            if (total_items, total_price) != actual.get(cart_id, (0, Decimal('0.00')))
+        ]
+
+        if options['check']:
+            if mismatched:
+                raise CommandError(f'Итоги расходятся в {len(mismatched)} корзинах: {mismatched[:20]}')
+            self.stdout.write(self.style.SUCCESS('Итоги всех корзин корректны'))
+            return
+
+        updated = 0
+        for start in range(0, len(mismatched), BATCH_SIZE):
+            batch = mismatched[start:start + BATCH_SIZE]
+            updated += Cart.recalculate_totals(Cart.objects.filter(pk__in=batch))
+        self.stdout.write(self.style.SUCCESS(f'Исправлено корзин: {updated}'))
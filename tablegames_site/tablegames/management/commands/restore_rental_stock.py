@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from tablegames import caching, catalog, rentals
+from tablegames.models import Game, GameRental
+
+
+class Command(BaseCommand):
+    help = (
+        'Одноразовый перевод прокатного фонда на учет занятости по датам: возвращает в '
+        'available_for_rental экземпляры незавершенных аренд, которые раньше списывались '
+        'с поля навсегда. Повторный запуск вернет их еще раз'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать изменения, ничего не записывая')
+
+    def handle(self, *args, **options):
+        # Завершенные и отмененные аренды уже вернул на склад прежний учет -
+        # списанными остаются только экземпляры аренд pending/active
+        rented = dict(
+            GameRental.objects.filter(status__in=rentals.ACTIVE_STATUSES).order_by()
+            .values('game').annotate(total=Sum('quantity')).values_list('game', 'total')
+        )
+        games = Game.objects.filter(pk__in=rented.keys()).only('id', 'name', 'available_for_rental').order_by('pk')
+
+        for game in games:
+            self.stdout.write(
+                f'{game.name}: {game.available_for_rental} -> {game.available_for_rental + rented[game.pk]}'
+            )
+        if options['dry_run']:
+            self.stdout.write(f'Игр к исправлению: {len(rented)} (без изменений, --dry-run)')
+            return
+
+        with transaction.atomic():
+            for game_id, quantity in rented.items():
+                Game.objects.filter(pk=game_id).update(
+                    available_for_rental=F('available_for_rental') + quantity, updated_at=timezone.now(),
+                )
+            # Массовый UPDATE минует сигналы - сбрасываем кеш игр и фасетов сами
+            caching.invalidate(Game, rented.keys())
+            catalog.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Исправлено игр: {len(rented)}'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from tablegames import jobs
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди фоновых задач (таблица Job); повторы с экспоненциальной задержкой'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться')
+        parser.add_argument('--batch', type=int, default=jobs.BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=1.0, help='Пауза при пустой очереди, секунд')
+        parser.add_argument('--worker', default='', help='Имя обработчика (по умолчанию хост:pid)')
+
+    def handle(self, *args, **options):
+        try:
+            processed = jobs.work(
+                worker=options['worker'] or None,
+                once=options['once'],
+                batch=options['batch'],
+                idle_sleep=options['sleep'],
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(f'Выполнено задач: {processed}')
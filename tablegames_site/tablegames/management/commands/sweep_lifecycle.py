@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tablegames import lifecycle
+
+
+class Command(BaseCommand):
+    help = 'Завершает прошедшие брони столиков и истекшие аренды игр пачками UPDATE (запуск по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=lifecycle.BATCH_SIZE)
+        parser.add_argument('--skip-bookings', action='store_true')
+        parser.add_argument('--skip-rentals', action='store_true')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        verbose = options['verbosity'] > 1
+        batch = options['batch']
+        results = []
+        if not options['skip_bookings']:
+            results += lifecycle.sweep_bookings(batch=batch, on_batch=self._report if verbose else None)
+        if not options['skip_rentals']:
+            results += lifecycle.sweep_rentals(batch=batch, on_batch=self._report if verbose else None)
+
+        for progress in results:
+            self.stdout.write(
+                f'{progress.label}: {progress.updated} за {progress.batches} пачек, '
+                f'{progress.rate:.0f} строк/с'
+            )
+        total = sum(progress.updated for progress in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Переведено записей: {total} за {time.perf_counter() - started:.2f} с'
+        ))
+
+    def _report(self, progress):
+        self.stdout.write(f'  {progress.label}: {progress.updated} ({progress.rate:.0f} строк/с)')
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:03
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('tablegames', 'Cart')
+    CartItem = apps.get_model('tablegames', 'CartItem')
+    Game = apps.get_model('tablegames', 'Game')
+
+    CartItem.objects.update(
+        unit_price=Subquery(Game.objects.filter(pk=OuterRef('game_id')).values('price')[:1])
+    )
+    for cart in Cart.objects.all():
+        totals = CartItem.objects.filter(cart=cart).aggregate(
+            items=Sum('quantity'),
+            amount=Sum(F('quantity') * F('unit_price')),
+        )
+        cart.total_items = totals['items'] or 0
+        cart.total_price = totals['amount'] or Decimal('0.00')
+        cart.save(update_fields=['total_items', 'total_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0002_alter_purchaseorder_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество товаров'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Сумма'),
+        ),
+        migrations.AddField(
+            model_name='cartitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Цена за штуку'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
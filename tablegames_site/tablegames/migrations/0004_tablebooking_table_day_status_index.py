@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0003_cart_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tablebooking',
+            index=models.Index(fields=['table', 'booking_date', 'status'], name='booking_table_day_status_idx'),
+        ),
+    ]
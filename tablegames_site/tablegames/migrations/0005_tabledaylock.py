@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0004_tablebooking_table_day_status_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableDayLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booking_date', models.DateField(verbose_name='Дата бронирования')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tablegames.gametable', verbose_name='Столик')),
+            ],
+            options={
+                'verbose_name': 'Блокировка столика на день',
+                'verbose_name_plural': 'Блокировки столиков на день',
+                'unique_together': {('table', 'booking_date')},
+            },
+        ),
+    ]
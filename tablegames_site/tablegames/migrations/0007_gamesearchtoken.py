@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0006_game_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Вес')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='tablegames.game', verbose_name='Игра')),
+            ],
+            options={
+                'verbose_name': 'Поисковый токен',
+                'verbose_name_plural': 'Поисковые токены',
+                'indexes': [models.Index(fields=['token', '-weight'], name='search_token_weight_idx')],
+                'unique_together': {('token', 'game')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0007_gamesearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('last_value', models.PositiveBigIntegerField(default=0, verbose_name='Последнее значение')),
+            ],
+            options={
+                'verbose_name': 'Счетчик номеров',
+                'verbose_name_plural': 'Счетчики номеров',
+            },
+        ),
+    ]
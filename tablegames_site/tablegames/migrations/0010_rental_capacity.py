@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0009_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamerental',
+            index=models.Index(fields=['game', 'status', 'rental_end_date'], name='rental_game_status_end_idx'),
+        ),
+    ]
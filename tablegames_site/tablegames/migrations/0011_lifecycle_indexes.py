@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0010_rental_capacity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamerental',
+            index=models.Index(fields=['status', 'rental_end_date'], name='rental_status_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tablebooking',
+            index=models.Index(fields=['status', 'booking_date'], name='booking_status_date_idx'),
+        ),
+    ]
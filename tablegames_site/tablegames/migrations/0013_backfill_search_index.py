@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:05
+
+import re
+from collections import Counter
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Токенизатор заморожен копией tablegames.search на момент миграции: результат
+# миграции не должен меняться вместе со стеммером, а переименование функций
+# в search - ломать ее. Индекс по новым правилам строит rebuild_search_index
+NAME_WEIGHT = 5
+DESCRIPTION_WEIGHT = 1
+MAX_TOKEN_LENGTH = 64
+
+WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+STOP_WORDS = {
+    'и', 'в', 'во', 'не', 'на', 'с', 'со', 'по', 'к', 'ко', 'у', 'о', 'об', 'от', 'до', 'за', 'из',
+    'для', 'а', 'но', 'или', 'что', 'как', 'это', 'the', 'a', 'an', 'of', 'and', 'or', 'to', 'in',
+}
+
+# Окончания русских слов, от длинных к коротким (упрощенный стеммер в духе Snowball)
+RUSSIAN_ENDINGS = sorted([
+    'ившись', 'ывшись', 'вшись', 'ующими', 'ующего', 'ующему', 'ующая', 'ующее', 'ующий', 'ующих',
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ость', 'ости', 'остью', 'ей', 'ой', 'ий', 'ый',
+    'ая', 'яя', 'ое', 'ее', 'ие', 'ые', 'ого', 'его', 'ому', 'ему', 'ими', 'ыми', 'их', 'ых', 'ую', 'юю',
+    'ом', 'ем', 'им', 'ым', 'ах', 'ях', 'ам', 'ям', 'ов', 'ев', 'ия', 'ья', 'ью', 'ье', 'ии',
+    'ать', 'ять', 'ить', 'еть', 'уть', 'ешь', 'ете', 'ите', 'ишь', 'ует', 'уют', 'ают', 'яют',
+    'ла', 'ли', 'ло', 'ть', 'ет', 'ит', 'ут', 'ют', 'ат', 'ят',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+
+def stem(word):
+    if not ('а' <= word[0] <= 'я'):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста без стоп-слов: нижний регистр, ё -> е, отброшенные окончания."""
+    words = WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+    return [stem(word)[:MAX_TOKEN_LENGTH] for word in words if word not in STOP_WORDS]
+
+
+def game_tokens(game):
+    weights = Counter()
+    for token in tokenize(game.name):
+        weights[token] += NAME_WEIGHT
+    for token in tokenize(game.description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def backfill_search_index(apps, schema_editor):
+    # Игры, созданные до 0007, в индекс не попали: сигнал индексирует только
+    # новые сохранения. Пересобираем индекс целиком, как rebuild_search_index
+    Game = apps.get_model('tablegames', 'Game')
+    GameSearchToken = apps.get_model('tablegames', 'GameSearchToken')
+
+    GameSearchToken.objects.all().delete()
+    tokens = []
+    for game in Game.objects.only('id', 'name', 'description').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        tokens.extend(
+            GameSearchToken(game_id=game.pk, token=token, weight=weight)
+            for token, weight in game_tokens(game).items()
+        )
+        if len(tokens) >= BATCH_SIZE:
+            GameSearchToken.objects.bulk_create(tokens)
+            tokens = []
+    GameSearchToken.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablegames', '0012_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
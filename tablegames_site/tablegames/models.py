@@ -1,4 +1,9 @@
-from django.db import models
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.contrib.auth.models import User
@@ -29,18 +34,47 @@ class Game(models.Model):
         verbose_name='Сложность (1-5)'
     )
     in_stock = models.PositiveIntegerField(default=0, verbose_name='В наличии для покупки')
+    # Всего экземпляров для аренды; свободные на даты считает rentals.max_free
     available_for_rental = models.PositiveIntegerField(default=0, verbose_name='Доступно для аренды')
     image = models.ImageField(upload_to='games/', blank=True, null=True, verbose_name='Изображение')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Для ETag/Last-Modified каталога; массовые UPDATE остатков выставляют его сами
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Игра'
         verbose_name_plural = 'Игры'
+        indexes = [
+            models.Index(fields=['category', 'price'], name='game_category_price_idx'),
+            models.Index(fields=['min_players', 'max_players'], name='game_players_idx'),
+            models.Index(fields=['difficulty', 'play_time_minutes'], name='game_difficulty_time_idx'),
+            models.Index(fields=['play_time_minutes'], name='game_play_time_idx'),
+            models.Index(fields=['price'], name='game_price_idx'),
+            models.Index(fields=['in_stock', 'available_for_rental'], name='game_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class GameSearchToken(models.Model):
+    """Запись инвертированного индекса: основа слова из названия или описания игры."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='search_tokens', verbose_name='Игра')
+    token = models.CharField(max_length=64, verbose_name='Основа слова')
+    weight = models.PositiveIntegerField(default=1, verbose_name='Вес')
+
+    class Meta:
+        verbose_name = 'Поисковый токен'
+        verbose_name_plural = 'Поисковые токены'
+        unique_together = ['token', 'game']
+        indexes = [
+            models.Index(fields=['token', '-weight'], name='search_token_weight_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.token} -> {self.game_id}'
+
+
 class GameTable(models.Model):
     TABLE_TYPES = [
         ('small', 'Маленький (2-4 человека)'),
@@ -56,6 +90,7 @@ class GameTable(models.Model):
                                                     verbose_name='Цена за час за человека')
     description = models.TextField(blank=True, verbose_name='Описание')
     is_active = models.BooleanField(default=True, verbose_name='Активен')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Игровой столик'
@@ -81,6 +116,9 @@ class Customer(models.Model):
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name='Пользователь')
+    total_items = models.PositiveIntegerField(default=0, verbose_name='Количество товаров')
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'),
+                                      verbose_name='Сумма')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -91,21 +129,66 @@ class Cart(models.Model):
     def __str__(self):
         return f'Корзина пользователя {self.user.username}'
 
-    @property
-    def total_price(self):
-        return sum(item.total_price for item in self.items.all())
-
-    @property
-    def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+    def clear(self):
+        """Удаляет все позиции одним DELETE и обнуляет итоги."""
+        # Базовый QuerySet.delete: итоги обнуляем сами, без агрегации по позициям
+        models.QuerySet.delete(CartItem.objects.filter(cart=self))
+        Cart.objects.filter(pk=self.pk).update(total_items=0, total_price=Decimal('0.00'))
+        self.total_items = 0
+        self.total_price = Decimal('0.00')
+
+    @classmethod
+    def apply_delta(cls, cart_id, items, amount):
+        if items or amount:
+            cls.objects.filter(pk=cart_id).update(
+                total_items=F('total_items') + items,
+                total_price=F('total_price') + amount,
+            )
+
+    @classmethod
+    def recalculate_totals(cls, queryset=None):
+        """Пересчитывает итоги по позициям для набора корзин одним UPDATE."""
+        if queryset is None:
+            queryset = cls.objects.all()
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        return queryset.update(
+            total_items=Coalesce(Subquery(items.annotate(s=Sum('quantity')).values('s')), 0),
+            total_price=Coalesce(
+                Subquery(items.annotate(s=Sum(F('quantity') * F('unit_price'))).values('s')),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
+class CartItemQuerySet(models.QuerySet):
+    def delete(self):
+        # Массовое удаление (например, очистка корзины при оформлении заказа):
+        # вычитаем суммы из итогов корзин одним UPDATE на каждую корзину
+        # Суммы и удаление - одной транзакцией, иначе параллельное изменение
+        # позиции между ними разошлось бы с итогами
+        with transaction.atomic():
+            deltas = list(
+                self.order_by().values('cart_id').annotate(
+                    items=Sum('quantity'),
+                    amount=Sum(F('quantity') * F('unit_price')),
+                )
+            )
+            result = super().delete()
+            for delta in deltas:
+                Cart.apply_delta(delta['cart_id'], -delta['items'], -(delta['amount'] or 0))
+        return result
 
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items', verbose_name='Корзина')
     game = models.ForeignKey(Game, on_delete=models.CASCADE, verbose_name='Игра')
     quantity = models.PositiveIntegerField(default=1, verbose_name='Количество')
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена за штуку')
     added_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Элемент корзины'
         verbose_name_plural = 'Элементы корзины'
@@ -114,9 +197,73 @@ class CartItem(models.Model):
     def __str__(self):
         return f'{self.game.name} x{self.quantity}'
 
+    def _saved_row(self):
+        # Итоги меняем на разницу с версией строки в базе, а не в памяти:
+        # параллельный запрос мог изменить позицию после ее загрузки
+        if self._state.adding or self.pk is None:
+            return 0, Decimal('0.00')
+        row = CartItem.objects.select_for_update().filter(pk=self.pk).values_list('quantity', 'unit_price').first()
+        return row or (0, Decimal('0.00'))
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.game.price
+        with transaction.atomic():
+            saved_quantity, saved_price = self._saved_row()
+            super().save(*args, **kwargs)
+            Cart.apply_delta(
+                self.cart_id,
+                self.quantity - saved_quantity,
+                self.total_price - saved_price * saved_quantity,
+            )
+        self._refresh_cached_cart()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            saved_quantity, saved_price = self._saved_row()
+            result = super().delete(*args, **kwargs)
+            Cart.apply_delta(self.cart_id, -saved_quantity, -saved_price * saved_quantity)
+        self._refresh_cached_cart()
+        return result
+
+    def adjust_quantity(self, delta, limit=None):
+        """
+        Атомарно меняет количество на delta одним UPDATE с F-выражением.
+
+        Не уменьшает ниже 1 и не увеличивает выше limit; в этих случаях
+        возвращает False и ничего не меняет. Параллельные нажатия "+" не
+        теряются, а итоги корзины меняются ровно на примененную разницу.
+        """
+        rows = CartItem.objects.filter(pk=self.pk)
+        if delta < 0:
+            rows = rows.filter(quantity__gt=-delta)
+        elif limit is not None:
+            rows = rows.filter(quantity__lte=limit - delta)
+        with transaction.atomic():
+            if not rows.update(quantity=F('quantity') + delta):
+                return False
+            # Цену берем из строки, а не из памяти: sync_cart_prices мог
+            # изменить ее после загрузки позиции
+            unit_price = Subquery(CartItem.objects.filter(pk=self.pk).values('unit_price'))
+            Cart.apply_delta(self.cart_id, delta, unit_price * delta)
+            # Новое количество, цена и итоги корзины - одним SELECT, а не двумя refresh_from_db
+            self.quantity, self.unit_price, total_items, total_price = CartItem.objects.filter(
+                pk=self.pk
+            ).values_list('quantity', 'unit_price', 'cart__total_items', 'cart__total_price').get()
+        if CartItem.cart.is_cached(self):
+            self.cart.total_items, self.cart.total_price = total_items, total_price
+        return True
+
+    async def aadjust_quantity(self, delta, limit=None):
+        return await sync_to_async(self.adjust_quantity)(delta, limit)
+
+    def _refresh_cached_cart(self):
+        if CartItem.cart.is_cached(self):
+            self.cart.refresh_from_db(fields=['total_items', 'total_price'])
+
     @property
     def total_price(self):
-        return self.game.price * self.quantity
+        return self.unit_price * self.quantity
 
 
 class TableBooking(models.Model):
@@ -144,11 +291,31 @@ class TableBooking(models.Model):
         verbose_name = 'Бронирование столика'
         verbose_name_plural = 'Бронирования столиков'
         unique_together = ['table', 'booking_date', 'start_time']
+        indexes = [
+            models.Index(fields=['table', 'booking_date', 'status'], name='booking_table_day_status_idx'),
+            # Поиск прошедших броней для sweep_lifecycle
+            models.Index(fields=['status', 'booking_date'], name='booking_status_date_idx'),
+        ]
 
     def __str__(self):
         return f"Бронирование {self.table.name} на {self.booking_date}"
 
 
+class TableDayLock(models.Model):
+    """Строка-замок: бронирования одного столика на один день создаются по очереди."""
+    table = models.ForeignKey(GameTable, on_delete=models.CASCADE, verbose_name='Столик')
+    booking_date = models.DateField(verbose_name='Дата бронирования')
+    version = models.PositiveIntegerField(default=0, verbose_name='Версия')
+
+    class Meta:
+        verbose_name = 'Блокировка столика на день'
+        verbose_name_plural = 'Блокировки столиков на день'
+        unique_together = ['table', 'booking_date']
+
+    def __str__(self):
+        return f'{self.table.name} на {self.booking_date}'
+
+
 class GameRental(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, verbose_name='Клиент')
     game = models.ForeignKey(Game, on_delete=models.CASCADE, verbose_name='Игра')
@@ -172,6 +339,12 @@ class GameRental(models.Model):
     class Meta:
         verbose_name = 'Аренда игры'
         verbose_name_plural = 'Аренды игр'
+        indexes = [
+            # Пересекающиеся аренды игры: status IN (...) и rental_end_date > начала периода
+            models.Index(fields=['game', 'status', 'rental_end_date'], name='rental_game_status_end_idx'),
+            # Поиск истекших аренд для sweep_lifecycle
+            models.Index(fields=['status', 'rental_end_date'], name='rental_status_end_idx'),
+        ]
 
     def __str__(self):
         return f"Аренда {self.game.name} - {self.customer}"
@@ -205,12 +378,24 @@ class PurchaseOrder(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.order_number:
-            import random
-            import string
-            self.order_number = 'ORD' + ''.join(random.choices(string.digits, k=7))
+            from .numbering import next_order_number
+            self.order_number = next_order_number()
         super().save(*args, **kwargs)
 
 
+class NumberSequence(models.Model):
+    """Счетчик для выдачи номеров блоками: хранит последнее выданное значение."""
+    name = models.CharField(max_length=50, unique=True, verbose_name='Название')
+    last_value = models.PositiveBigIntegerField(default=0, verbose_name='Последнее значение')
+
+    class Meta:
+        verbose_name = 'Счетчик номеров'
+        verbose_name_plural = 'Счетчики номеров'
+
+    def __str__(self):
+        return f'{self.name}: {self.last_value}'
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='items', verbose_name='Заказ')
     game = models.ForeignKey(Game, on_delete=models.CASCADE, verbose_name='Игра')
@@ -222,4 +407,36 @@ class OrderItem(models.Model):
         verbose_name_plural = 'Элементы заказа'
 
     def __str__(self):
-        return f"{self.game.name} x{self.quantity}"
\ No newline at end of file
+        return f"{self.game.name} x{self.quantity}"
+
+
+class Job(models.Model):
+    """Фоновая задача очереди: выполняется командой run_jobs после коммита запроса."""
+    STATUS_CHOICES = [
+        ('queued', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name='Задача')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='Запустить не раньше')
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name='Обработчик')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Взята в работу')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.get_status_display()})'
@@ -0,0 +1,85 @@
+import threading
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import NumberSequence
+
+ORDER_SEQUENCE = 'purchase_order'
+ORDER_PREFIX = 'ORD-'
+ORDER_DIGITS = 7
+BLOCK_SIZE = 50
+
+
+def allocate_block(name, size=BLOCK_SIZE):
+    """Резервирует size номеров подряд и возвращает их диапазон."""
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                # UPDATE первым: блокировка строки (записи в SQLite) до чтения значения
+                updated = NumberSequence.objects.filter(name=name).update(last_value=F('last_value') + size)
+                if not updated:
+                    NumberSequence.objects.create(name=name, last_value=size)
+                last_value = NumberSequence.objects.filter(name=name).values_list('last_value', flat=True).get()
+            return range(last_value - size + 1, last_value + 1)
+        except IntegrityError:
+            # Счетчик параллельно создал другой процесс - повторяем через UPDATE
+            if attempt:
+                raise
+
+
+class _Block:
+    def __init__(self, numbers):
+        self.next = numbers.start
+        self.last = numbers[-1]
+        # Вне транзакции UPDATE счетчика уже закоммичен
+        self.confirmed = not connection.in_atomic_block
+        if not self.confirmed:
+            # При откате транзакции или точки сохранения хук не выполнится,
+            # и блок так и останется неподтвержденным
+            transaction.on_commit(self.confirm, robust=True)
+
+    def confirm(self):
+        self.confirmed = True
+
+    @property
+    def usable(self):
+        return self.confirmed and self.next <= self.last
+
+
+class BlockAllocator:
+    """
+    Выдает номера из заранее зарезервированного блока без обращения к базе.
+
+    Блок свой у каждого потока. Блок, зарезервированный внутри транзакции,
+    продолжается только после ее коммита (хук on_commit): при откате счетчик в
+    базе вернулся назад, и тот же диапазон может получить другой процесс.
+    Пока коммита не было, каждый номер резервирует новый блок - остатки
+    неподтвержденных блоков становятся пропусками в нумерации.
+    """
+
+    def __init__(self, name, size=BLOCK_SIZE):
+        self.name = name
+        self.size = size
+        self._local = threading.local()
+
+    def next(self):
+        block = getattr(self._local, 'block', None)
+        if block is None or not block.usable:
+            block = self._local.block = _Block(allocate_block(self.name, self.size))
+
+        value = block.next
+        block.next += 1
+        return value
+
+
+order_numbers = BlockAllocator(ORDER_SEQUENCE)
+
+
+def format_order_number(value):
+    return f'{ORDER_PREFIX}{value:0{ORDER_DIGITS}d}'
+
+
+def next_order_number():
+    """Номер заказа вида ORD-0000123; дефис отличает его от старых случайных номеров."""
+    return format_order_number(order_numbers.next())
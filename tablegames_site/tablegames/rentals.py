@@ -0,0 +1,118 @@
+import datetime
+import random
+import time
+from itertools import accumulate
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import caching
+from .models import Game, GameRental
+
+ACTIVE_STATUSES = ('pending', 'active')
+HORIZON_DAYS = 120
+OCCUPANCY_CACHE_TIMEOUT = 60 * 60
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 0.05
+
+
+class RentalUnavailable(Exception):
+    """На выбранные даты не хватает экземпляров игры."""
+
+
+def _days(start_date, end_date):
+    return (end_date - start_date).days
+
+
+def _compute_occupancy(game_id, start_date, end_date, exclude=None):
+    """
+    Занятые экземпляры на каждый день [start_date, end_date).
+
+    Аренда занимает дни [rental_start_date, rental_end_date): в день возврата
+    экземпляр уже свободен. Пересекающиеся аренды выбираются по индексу
+    (game, status, rental_end_date), занятость считается разностным массивом
+    за O(аренд + дней).
+    """
+    length = _days(start_date, end_date)
+    rentals = GameRental.objects.filter(
+        game_id=game_id,
+        status__in=ACTIVE_STATUSES,
+        rental_end_date__gt=start_date,
+        rental_start_date__lt=end_date,
+    )
+    if exclude is not None:
+        rentals = rentals.exclude(pk=exclude.pk)
+
+    delta = [0] * (length + 1)
+    for rental_start, rental_end, quantity in rentals.values_list('rental_start_date', 'rental_end_date', 'quantity'):
+        delta[max(_days(start_date, rental_start), 0)] += quantity
+        delta[min(_days(start_date, rental_end), length)] -= quantity
+    return list(accumulate(delta[:length]))
+
+
+def _game_key(game_id):
+    """Срез аренд для версии caching: все аренды одной игры."""
+    return f'game:{game_id}'
+
+
+@caching.cached(
+    'rental_occupancy', deps=lambda game_id, today: [(GameRental, _game_key(game_id))],
+    fresh=OCCUPANCY_CACHE_TIMEOUT,
+)
+def _window(game_id, today):
+    return _compute_occupancy(game_id, today, today + datetime.timedelta(days=HORIZON_DAYS))
+
+
+def occupancy(game_id, start_date, end_date, use_cache=True):
+    """
+    Занятые экземпляры по дням. Окно [сегодня, сегодня + HORIZON_DAYS)
+    кешируется массивом на игру; запросы за его пределами считаются напрямую.
+    """
+    today = timezone.localdate()
+    horizon = today + datetime.timedelta(days=HORIZON_DAYS)
+    if not use_cache or start_date < today or end_date > horizon:
+        return _compute_occupancy(game_id, start_date, end_date)
+    return _window(game_id, today)[_days(today, start_date):_days(today, end_date)]
+
+
+def max_free(game, start_date, end_date, use_cache=True):
+    """Сколько экземпляров можно взять на весь период [start_date, end_date): O(дней)."""
+    days = occupancy(game.pk, start_date, end_date, use_cache=use_cache)
+    return max(game.available_for_rental - max(days, default=0), 0)
+
+
+def calendar(game, start_date, days):
+    """Свободные экземпляры на каждый из days дней начиная со start_date."""
+    end_date = start_date + datetime.timedelta(days=days)
+    return [max(game.available_for_rental - busy, 0) for busy in occupancy(game.pk, start_date, end_date)]
+
+
+def invalidate(game_id):
+    """Сбрасывает занятость игры после коммита, чтобы не закешировать данные до него."""
+    caching.invalidate(GameRental, [_game_key(game_id)])
+
+
+def commit_rental(rental):
+    """
+    Сохраняет аренду, повторно проверяя свободные экземпляры под блокировкой игры.
+
+    Блокировка - пустой UPDATE строки игры: параллельные аренды одной игры
+    проверяются и сохраняются строго по очереди. Проверка идет мимо кеша.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                Game.objects.filter(pk=rental.game_id).update(available_for_rental=F('available_for_rental'))
+                game = Game.objects.only('id', 'name', 'available_for_rental').get(pk=rental.game_id)
+                busy = _compute_occupancy(game.pk, rental.rental_start_date, rental.rental_end_date,
+                                          exclude=rental if rental.pk else None)
+                free = max(game.available_for_rental - max(busy, default=0), 0)
+                if rental.quantity > free:
+                    raise RentalUnavailable(f'На выбранные даты доступно только {free} экз. игры "{game.name}"')
+                rental.save()
+                return rental
+        except (IntegrityError, OperationalError):
+            if attempt == MAX_ATTEMPTS:
+                raise
+            time.sleep(RETRY_DELAY * attempt * (1 + random.random()))
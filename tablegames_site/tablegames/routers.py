@@ -0,0 +1,129 @@
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+# Модели каталога: читаются витриной постоянно, пишутся редко (админка, склад).
+# Остальные модели приложения (корзины, заказы, брони, аренды) - только основная база.
+CATALOG_MODELS = {'game', 'gametable'}
+
+STICKY_COOKIE = 'tablegames_primary'
+STICKY_SECONDS = 5
+
+# Состояние текущего запроса; изменяемый объект, а не значение: запись из
+# sync_to_async должна быть видна middleware после возврата в корутину
+_request_state = ContextVar('tablegames_db_state', default=None)
+
+
+class _RequestState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def read_databases():
+    """Пул соединений для чтения каталога (реплики или соединения только для чтения)."""
+    return getattr(settings, 'TABLEGAMES_READ_DATABASES', ())
+
+
+def sticky_seconds():
+    return getattr(settings, 'TABLEGAMES_PRIMARY_STICKY_SECONDS', STICKY_SECONDS)
+
+
+def _is_catalog(model):
+    return model._meta.app_label == 'tablegames' and model._meta.model_name in CATALOG_MODELS
+
+
+class PrimaryReplicaRouter:
+    """
+    Каталог (Game, GameTable) читается из пула TABLEGAMES_READ_DATABASES,
+    все остальное и все записи - основная база.
+
+    Чтение остается на основной базе, если:
+    - открыта транзакция основного соединения: проверки под блокировкой
+      (резерв склада, аренды) должны видеть свои же изменения;
+    - пользователь недавно что-то записал (read-your-writes): после записи
+      в модели приложения PrimaryStickinessMiddleware на STICKY_SECONDS
+      закрепляет его запросы за основной базой, пока реплики догоняют.
+    """
+
+    def db_for_read(self, model, **hints):
+        pool = read_databases()
+        if not pool or not _is_catalog(model):
+            return PRIMARY
+        state = _request_state.get()
+        if (state is not None and state.pinned) or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return random.choice(pool)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label == 'tablegames':
+            state.wrote = state.pinned = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же строки, что и основная база
+        aliases = {PRIMARY, *read_databases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in read_databases():
+            return False
+        return None
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Read-your-writes для пула реплик: запрос, записавший данные приложения,
+    ставит cookie, и следующие STICKY_SECONDS запросы этого пользователя
+    читают каталог с основной базы. Без пула реплик ничего не делает.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(response, state)
+
+    def _start(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        state = _RequestState(pinned=pinned_until > time.time())
+        return state, _request_state.set(state)
+
+    def _finish(self, response, state):
+        if state.wrote and read_databases():
+            seconds = sticky_seconds()
+            response.set_cookie(STICKY_COOKIE, f'{time.time() + seconds:.3f}',
+                                max_age=seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,188 @@
+import math
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import caching, catalog
+from .models import Game, GameSearchToken
+
+NAME_WEIGHT = 5
+DESCRIPTION_WEIGHT = 1
+MAX_TOKEN_LENGTH = 64
+MIN_PREFIX_LENGTH = 3
+MAX_PREFIX_EXPANSIONS = 20
+CANDIDATES_PER_TERM = 500
+DF_CACHE_TIMEOUT = 60 * 60
+
+WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+STOP_WORDS = {
+    'и', 'в', 'во', 'не', 'на', 'с', 'со', 'по', 'к', 'ко', 'у', 'о', 'об', 'от', 'до', 'за', 'из',
+    'для', 'а', 'но', 'или', 'что', 'как', 'это', 'the', 'a', 'an', 'of', 'and', 'or', 'to', 'in',
+}
+
+# Окончания русских слов, от длинных к коротким (упрощенный стеммер в духе Snowball)
+RUSSIAN_ENDINGS = sorted([
+    'ившись', 'ывшись', 'вшись', 'ующими', 'ующего', 'ующему', 'ующая', 'ующее', 'ующий', 'ующих',
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ость', 'ости', 'остью', 'ей', 'ой', 'ий', 'ый',
+    'ая', 'яя', 'ое', 'ее', 'ие', 'ые', 'ого', 'его', 'ому', 'ему', 'ими', 'ыми', 'их', 'ых', 'ую', 'юю',
+    'ом', 'ем', 'им', 'ым', 'ах', 'ях', 'ам', 'ям', 'ов', 'ев', 'ия', 'ья', 'ью', 'ье', 'ии',
+    'ать', 'ять', 'ить', 'еть', 'уть', 'ешь', 'ете', 'ите', 'ишь', 'ует', 'уют', 'ают', 'яют',
+    'ла', 'ли', 'ло', 'ть', 'ет', 'ит', 'ут', 'ют', 'ат', 'ят',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+
+def stem(word):
+    if not ('а' <= word[0] <= 'я'):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Основы слов текста без стоп-слов: нижний регистр, ё -> е, отброшенные окончания."""
+    words = WORD_RE.findall((text or '').lower().replace('ё', 'е'))
+    return [stem(word)[:MAX_TOKEN_LENGTH] for word in words if word not in STOP_WORDS]
+
+
+def game_tokens(game):
+    weights = Counter()
+    for token in tokenize(game.name):
+        weights[token] += NAME_WEIGHT
+    for token in tokenize(game.description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def index_game(game):
+    """Перестраивает записи индекса для одной игры."""
+    with transaction.atomic():
+        GameSearchToken.objects.filter(game=game).delete()
+        GameSearchToken.objects.bulk_create([
+            GameSearchToken(game=game, token=token, weight=weight)
+            for token, weight in game_tokens(game).items()
+        ])
+        # bulk_create минует сигналы - частоты основ сбрасываем сами
+        caching.invalidate(GameSearchToken)
+
+
+def rebuild_index(batch_size=500):
+    """Полностью пересобирает индекс; возвращает количество проиндексированных игр."""
+    indexed = 0
+    with transaction.atomic():
+        GameSearchToken.objects.all().delete()
+        games = Game.objects.only('id', 'name', 'description').order_by('pk')
+        tokens = []
+        for game in games.iterator(chunk_size=batch_size):
+            tokens.extend(
+                GameSearchToken(game_id=game.pk, token=token, weight=weight)
+                for token, weight in game_tokens(game).items()
+            )
+            indexed += 1
+            if len(tokens) >= batch_size:
+                GameSearchToken.objects.bulk_create(tokens)
+                tokens = []
+        GameSearchToken.objects.bulk_create(tokens)
+        caching.invalidate(GameSearchToken)
+    return indexed
+
+
+def _document_frequencies(terms):
+    """Число игр с каждой основой; кешируется до следующего изменения индекса."""
+    keys = {f'search_df:{token}': token for token in terms}
+
+    def count(missing):
+        tokens = [keys[key] for key in missing]
+        counted = dict(
+            GameSearchToken.objects.filter(token__in=tokens).order_by()
+            .values_list('token').annotate(count=Count('id'))
+        )
+        return {key: counted.get(keys[key], 0) for key in missing}
+
+    cached = caching.get_many_or_compute(
+        {key: (GameSearchToken,) for key in keys}, count, fresh=DF_CACHE_TIMEOUT, stale=DF_CACHE_TIMEOUT,
+    )
+    return {keys[key]: frequency for key, frequency in cached.items()}
+
+
+def _prefix_expansions(prefix):
+    """
+    Различные основы, начинающиеся с prefix.
+
+    Каждая следующая основа ищется отдельным поиском по индексу: DISTINCT
+    прочитал бы все записи частого слова, а LIKE 'prefix%' в SQLite индекс
+    не использует вовсе.
+    """
+    expansions = []
+    upper = prefix + '\uffff'
+    lookup = {'token__gte': prefix}
+    tokens = GameSearchToken.objects.order_by('token').values_list('token', flat=True)
+    while len(expansions) < MAX_PREFIX_EXPANSIONS:
+        token = tokens.filter(token__lt=upper, **lookup).first()
+        if token is None:
+            break
+        expansions.append(token)
+        lookup = {'token__gt': token}
+    return expansions
+
+
+def _query_terms(query):
+    """Основы запроса; последнее слово дополняется основами, которые с него начинаются."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if terms and len(terms[-1]) >= MIN_PREFIX_LENGTH:
+        terms = list(dict.fromkeys(terms + _prefix_expansions(terms[-1])))
+    return terms
+
+
+def search_ids(query, limit=50):
+    """
+    id игр, отсортированные по релевантности.
+
+    Релевантность - сумма weight * idf по найденным основам; последнее слово
+    запроса ищется и как префикс, чтобы работал поиск по началу слова. Для
+    каждой основы читаются только CANDIDATES_PER_TERM записей с наибольшим
+    весом (индекс token, -weight), поэтому время ответа не зависит от того,
+    сколько игр содержат частое слово.
+    """
+    terms = _query_terms(query)
+    if not terms:
+        return []
+
+    frequencies = {token: count for token, count in _document_frequencies(terms).items() if count}
+    if not frequencies:
+        return []
+
+    total = catalog.filtered_count() or 1
+    scores = Counter()
+    for token, count in frequencies.items():
+        idf = math.log(1 + total / count)
+        postings = GameSearchToken.objects.filter(token=token).order_by('-weight') \
+            .values_list('game_id', 'weight')[:CANDIDATES_PER_TERM]
+        for game_id, weight in postings:
+            scores[game_id] += weight * idf
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [game_id for game_id, score in ranked[:limit]]
+
+
+def matching_ids(query):
+    """
+    Подзапрос id всех игр с любой из основ запроса, без ранжирования и лимита.
+
+    Для фильтров вроде поиска в админке, где нужны все совпадения, а не
+    первые по релевантности.
+    """
+    return GameSearchToken.objects.filter(token__in=_query_terms(query)).values('game_id')
+
+
+def search_games(query, limit=50, queryset=None):
+    ids = search_ids(query, limit)
+    if queryset is None:
+        queryset = Game.objects.all()
+    games = queryset.in_bulk(ids)
+    return [games[pk] for pk in ids if pk in games]
@@ -0,0 +1,73 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import availability, cart_cache, caching, rentals, search
+from .models import Cart, CartItem, Game, GameRental, GameTable, TableBooking
+
+
+@receiver(post_save, sender=Game)
+def sync_cart_prices(sender, instance, **kwargs):
+    # При смене цены игры пересчитываем только затронутые корзины
+    stale = CartItem.objects.filter(game=instance).exclude(unit_price=instance.price)
+    carts = dict(stale.values_list('cart_id', 'cart__user_id'))
+    if carts:
+        stale.update(unit_price=instance.price)
+        Cart.recalculate_totals(Cart.objects.filter(pk__in=carts.keys()))
+        cart_cache.bump_versions_on_commit(carts.values())
+
+
+# Модели, версии которых служат зависимостями caching.cached, карточек игр
+# и счетчиков каталога. Обработчик не подключается ко всем моделям:
+# post_delete отключает быстрое удаление (очистка корзины превратилась бы
+# в SELECT + DELETE)
+CACHED_MODELS = (Game, GameTable, TableBooking, GameRental)
+
+
+def bump_cache_versions(sender, instance, **kwargs):
+    caching.invalidate_instance(instance)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(bump_cache_versions, sender=model)
+    post_delete.connect(bump_cache_versions, sender=model)
+
+
+@receiver(post_save, sender=Game)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'description'} & set(update_fields):
+        search.index_game(instance)
+
+
+@receiver(pre_delete, sender=Game)
+def remove_game_from_carts(sender, instance, **kwargs):
+    # Каскадное удаление обходит CartItemQuerySet.delete, поэтому удаляем позиции заранее
+    items = CartItem.objects.filter(game=instance)
+    user_ids = list(items.values_list('cart__user_id', flat=True))
+    if user_ids:
+        items.delete()
+        cart_cache.bump_versions_on_commit(user_ids)
+
+
+@receiver(pre_save, sender=TableBooking)
+def remember_booking_slot(sender, instance, **kwargs):
+    # Бронь могли перенести на другой день или столик - сбросим и старую ячейку сетки
+    instance._previous_slot = None
+    if instance.pk:
+        instance._previous_slot = TableBooking.objects.filter(pk=instance.pk).values_list(
+            'table_id', 'booking_date'
+        ).first()
+
+
+@receiver(post_save, sender=TableBooking)
+@receiver(post_delete, sender=TableBooking)
+def invalidate_availability_grid(sender, instance, **kwargs):
+    availability.invalidate_grid(instance.table_id, instance.booking_date)
+    previous = getattr(instance, '_previous_slot', None)
+    if previous:
+        availability.invalidate_grid(*previous)
+
+
+@receiver(post_save, sender=GameRental)
+@receiver(post_delete, sender=GameRental)
+def invalidate_rental_occupancy(sender, instance, **kwargs):
+    rentals.invalidate(instance.game_id)
@@ -1,110 +1,172 @@
 // static/js/cart.js
-document.addEventListener('DOMContentLoaded', function() {
-    // Функция для добавления в корзину
-    function addToCart(gameId, gameName) {
-        fetch(`/cart/add/${gameId}/`, {
+
+// Пакетная отправка изменений корзины: клики накапливаются и уходят одним
+// запросом на /cart/batch/ после паузы FLUSH_DELAY мс
+const CartBatch = (function() {
+    const FLUSH_DELAY = 400;
+    let pending = new Map();
+    let timer = null;
+    const listeners = [];
+
+    function queue(gameId, delta) {
+        gameId = String(gameId);
+        pending.set(gameId, (pending.get(gameId) || 0) + delta);
+        clearTimeout(timer);
+        timer = setTimeout(flush, FLUSH_DELAY);
+    }
+
+    function flush(keepalive) {
+        clearTimeout(timer);
+        const operations = [];
+        pending.forEach((delta, gameId) => {
+            if (delta !== 0) {
+                operations.push({game_id: Number(gameId), delta: delta});
+            }
+        });
+        pending = new Map();
+        if (operations.length === 0) {
+            return;
+        }
+
+        fetch('/cart/batch/', {
             method: 'POST',
+            keepalive: keepalive === true,
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': getCookie('csrftoken')
-            }
+            },
+            body: JSON.stringify({operations: operations})
         })
         .then(response => response.json())
         .then(data => {
-            if (data.success) {
-                // Показываем уведомление
-                showNotification(`"${gameName}" добавлен в корзину`, 'success');
-
-                // Обновляем счетчик в навбаре
-                updateCartCounter(data.cart_total);
-            } else {
-                showNotification(data.message, 'error');
-            }
+            listeners.forEach(listener => listener(data, operations));
         })
         .catch(error => {
             console.error('Error:', error);
-            showNotification('Ошибка при добавлении в корзину', 'error');
+            listeners.forEach(listener => listener({success: false, message: 'Ошибка при обновлении корзины'}, operations));
         });
     }
 
-    // Функция для показа уведомлений
-    function showNotification(message, type) {
-        // Создаем элемент уведомления
-        const notification = document.createElement('div');
-        notification.className = `alert alert-${type === 'success' ? 'success' : 'danger'} alert-dismissible fade show`;
-        notification.style.cssText = `
-            position: fixed;
-            top: 20px;
-            right: 20px;
-            z-index: 9999;
-            min-width: 300px;
-        `;
-        notification.innerHTML = `
-            ${message}
-            <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
-        `;
-
-        document.body.appendChild(notification);
-
-        // Автоматически скрываем через 3 секунды
-        setTimeout(() => {
-            if (notification.parentNode) {
-                notification.remove();
-            }
-        }, 3000);
+    function onResult(listener) {
+        listeners.push(listener);
     }
 
-    // Функция для обновления счетчика корзины
-    function updateCartCounter(count) {
-        let cartCounter = document.getElementById('cart-counter');
-        if (!cartCounter) {
-            // Создаем счетчик если его нет
-            const cartLink = document.querySelector('a[href*="cart"]');
-            if (cartLink) {
-                cartCounter = document.createElement('span');
-                cartCounter.id = 'cart-counter';
-                cartCounter.className = 'position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger';
-                cartLink.appendChild(cartCounter);
+    // Не теряем накопленные клики при уходе со страницы
+    window.addEventListener('pagehide', () => flush(true));
+
+    return {queue: queue, flush: flush, onResult: onResult};
+})();
+
+// Функция для получения CSRF токена
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
             }
         }
+    }
+    return cookieValue;
+}
 
-        if (cartCounter) {
-            cartCounter.textContent = count;
-            cartCounter.style.display = count > 0 ? 'inline' : 'none';
+const NOTIFICATION_TIMEOUT = 3000;
+
+// Функция для показа уведомлений
+function showNotification(message, type) {
+    // Создаем элемент уведомления
+    const notification = document.createElement('div');
+    notification.className = `alert alert-${type === 'success' ? 'success' : 'danger'} alert-dismissible fade show`;
+    notification.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        z-index: 9999;
+        min-width: 300px;
+    `;
+    notification.innerHTML = `
+        ${message}
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+
+    document.body.appendChild(notification);
+
+    // Автоматически скрываем через 3 секунды
+    setTimeout(() => {
+        if (notification.parentNode) {
+            notification.remove();
+        }
+    }, NOTIFICATION_TIMEOUT);
+}
+
+// Функция для обновления счетчика корзины
+function updateCartCounter(count) {
+    let cartCounter = document.getElementById('cart-counter');
+    if (!cartCounter) {
+        // Создаем счетчик если его нет
+        const cartLink = document.querySelector('a[href*="cart"]');
+        if (cartLink) {
+            cartCounter = document.createElement('span');
+            cartCounter.id = 'cart-counter';
+            cartCounter.className = 'position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger';
+            cartLink.appendChild(cartCounter);
         }
     }
 
-    // Функция для получения CSRF токена
-    function getCookie(name) {
-        let cookieValue = null;
-        if (document.cookie && document.cookie !== '') {
-            const cookies = document.cookie.split(';');
-            for (let i = 0; i < cookies.length; i++) {
-                const cookie = cookies[i].trim();
-                if (cookie.substring(0, name.length + 1) === (name + '=')) {
-                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
-                    break;
-                }
-            }
+    if (cartCounter) {
+        cartCounter.textContent = count;
+        cartCounter.style.display = count > 0 ? 'inline' : 'none';
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const gameNames = new Map();
+
+    // Счетчик меняем сразу, точное значение придет в ответе на пакет
+    function addToCart(gameId, gameName) {
+        gameNames.set(String(gameId), gameName);
+        const cartCounter = document.getElementById('cart-counter');
+        if (cartCounter) {
+            updateCartCounter((parseInt(cartCounter.textContent, 10) || 0) + 1);
         }
-        return cookieValue;
+        CartBatch.queue(gameId, 1);
     }
 
+    CartBatch.onResult(function(data, operations) {
+        if (!data.success) {
+            showNotification(data.message, 'error');
+            return;
+        }
+        updateCartCounter(data.cart_total);
+
+        const added = operations
+            .filter(operation => operation.delta > 0 && gameNames.has(String(operation.game_id)))
+            .map(operation => {
+                const name = gameNames.get(String(operation.game_id));
+                return operation.delta > 1 ? `"${name}" (${operation.delta} шт.)` : `"${name}"`;
+            });
+        if (added.length) {
+            showNotification(`${added.join(', ')} ${added.length > 1 ? 'добавлены' : 'добавлен'} в корзину`, 'success');
+        }
+        data.warnings.forEach(warning => showNotification(warning, 'error'));
+    });
+
     // Обработчики для кнопок "В корзину"
     document.querySelectorAll('.add-to-cart-btn').forEach(btn => {
         btn.addEventListener('click', function() {
-            const gameId = this.dataset.gameId;
-            const gameName = this.dataset.gameName;
-            addToCart(gameId, gameName);
+            addToCart(this.dataset.gameId, this.dataset.gameName);
         });
     });
 
-    // Загружаем начальное количество товаров в корзине
-    if (document.querySelector('.add-to-cart-btn')) {
+    // Загружаем начальное количество товаров в корзине, если сервер не отрисовал счетчик
+    if (document.querySelector('.add-to-cart-btn') && !document.getElementById('cart-counter')) {
         fetch('/cart/count/')
             .then(response => response.json())
             .then(data => {
                 updateCartCounter(data.count);
             });
     }
-});
\ No newline at end of file
+});
@@ -0,0 +1,35 @@
+from django.core.mail import send_mail
+
+from .jobs import task
+from .models import PurchaseOrder, TableBooking
+
+
+@task('send_order_confirmation')
+def send_order_confirmation(order_id):
+    order = PurchaseOrder.objects.select_related('customer__user').filter(pk=order_id).first()
+    if order is None or not order.customer.user.email:
+        return
+    lines = [
+        f'{item.game.name} x{item.quantity} - {item.price * item.quantity} руб.'
+        for item in order.items.select_related('game')
+    ]
+    send_mail(
+        f'Заказ #{order.order_number} принят',
+        '\n'.join([*lines, '', f'Итого: {order.total_amount} руб.', f'Адрес доставки: {order.shipping_address}']),
+        None,
+        [order.customer.user.email],
+    )
+
+
+@task('send_booking_confirmation')
+def send_booking_confirmation(booking_id):
+    booking = TableBooking.objects.select_related('customer__user', 'table').filter(pk=booking_id).first()
+    if booking is None or not booking.customer.user.email:
+        return
+    send_mail(
+        f'Бронирование столика {booking.table.name}',
+        f'{booking.booking_date:%d.%m.%Y}, {booking.start_time:%H:%M}-{booking.end_time:%H:%M}, '
+        f'{booking.number_of_people} чел. Стоимость: {booking.total_price} руб.',
+        None,
+        [booking.customer.user.email],
+    )
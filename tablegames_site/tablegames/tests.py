@@ -1,3 +1,1127 @@
-from django.test import TestCase
+import datetime
+import importlib
+import importlib.util
+import json
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.template import loader
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import availability, benchmark, caching, cards, catalog, homepage, instrumentation, inventory, jobs, lifecycle, numbering, rentals, routers, search
+from .bookings import BookingConflict, commit_booking
+from .checkout import place_order
+from .models import Cart, CartItem, Customer, Game, GameRental, GameSearchToken, GameTable, Job, PurchaseOrder, TableBooking
+
+
+def run_concurrently(target, arguments):
+    """Запускает target в отдельном потоке для каждого набора аргументов одновременно."""
+    barrier = threading.Barrier(len(arguments))
+    results = [None] * len(arguments)
+
+    def worker(index, args):
+        try:
+            barrier.wait()
+            results[index] = target(*args)
+        except Exception as e:
+            results[index] = e
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index, args)) for index, args in enumerate(arguments)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def create_game(name, **fields):
+    defaults = {
+        'description': '', 'category': 'strategy', 'price': Decimal('1000.00'),
+        'rental_price_per_day': Decimal('100.00'), 'min_players': 2, 'max_players': 4,
+        'play_time_minutes': 60, 'difficulty': 2, 'in_stock': 5, 'available_for_rental': 1,
+    }
+    return Game.objects.create(name=name, **{**defaults, **fields})
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    WORKERS = 8
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Нужна файловая тестовая база: потоки используют отдельные соединения')
+        user = User.objects.create_user('booker', password='secret')
+        self.customer = Customer.objects.create(user=user, phone='', address='')
+        self.table = GameTable.objects.create(name='Стол 1', table_type='small', capacity=4)
+        self.other_table = GameTable.objects.create(name='Стол 2', table_type='small', capacity=4)
+        self.date = datetime.date.today() + datetime.timedelta(days=7)
+
+    def book(self, table, start_hour, end_hour):
+        return commit_booking(TableBooking(
+            customer=self.customer,
+            table=table,
+            booking_date=self.date,
+            start_time=datetime.time(start_hour),
+            end_time=datetime.time(end_hour),
+            number_of_people=2,
+            total_price=Decimal('120.00'),
+        ))
+
+    def test_overlapping_bookings_only_one_wins(self):
+        # Все интервалы пересекаются с 18:00-19:00, но начинаются в разное время,
+        # поэтому unique_together по времени начала их не отсекает
+        arguments = [(self.table, 17 + index % 2, 19 + index % 3) for index in range(self.WORKERS)]
+        results = run_concurrently(self.book, arguments)
+
+        booked = [result for result in results if isinstance(result, TableBooking)]
+        conflicts = [result for result in results if isinstance(result, BookingConflict)]
+        self.assertEqual(len(booked), 1, results)
+        self.assertEqual(len(conflicts), self.WORKERS - 1, results)
+        self.assertEqual(TableBooking.objects.filter(table=self.table).count(), 1)
+
+    def test_different_tables_do_not_block_each_other(self):
+        arguments = [(self.table, 18, 20), (self.other_table, 18, 20)]
+        results = run_concurrently(self.book, arguments)
+
+        self.assertTrue(all(isinstance(result, TableBooking) for result in results), results)
+
+
+class ProfileQueryCountTests(TestCase):
+    MAX_QUERIES = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('regular', password='secret')
+        customer = Customer.objects.create(user=cls.user, phone='', address='Москва')
+        game = Game.objects.create(
+            name='Каркассон', description='Тайлы и замки', category='family', price=Decimal('2500.00'),
+            rental_price_per_day=Decimal('150.00'), min_players=2, max_players=5, play_time_minutes=45,
+            difficulty=2, in_stock=10, available_for_rental=10,
+        )
+        start = datetime.date.today() + datetime.timedelta(days=1)
+        for index in range(40):
+            table = GameTable.objects.create(name=f'Стол {index}', table_type='small', capacity=4)
+            TableBooking.objects.create(
+                customer=customer, table=table, booking_date=start, start_time=datetime.time(18),
+                end_time=datetime.time(20), number_of_people=2, total_price=Decimal('240.00'),
+            )
+            GameRental.objects.create(
+                customer=customer, game=game, rental_start_date=start,
+                rental_end_date=start + datetime.timedelta(days=2), total_price=Decimal('300.00'),
+            )
+            PurchaseOrder.objects.create(customer=customer, total_amount=Decimal('2500.00'), shipping_address='Москва')
+
+    def test_profile_query_count_is_bounded(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/profile/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['bookings']), 10)
+        self.assertEqual(len(response.context['feed']), 10)
+        self.assertLessEqual(len(queries), self.MAX_QUERIES, [query['sql'] for query in queries])
+
+    def test_section_pages_keep_other_sections_and_tab(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/profile/', {'rentals_page': 2})
+
+        self.assertContains(response, 'href="?rentals_page=2&amp;bookings_page=2#bookings"')
+        self.assertContains(response, 'href="?rentals_page=1#rentals"')
+        self.assertContains(response, 'href="?rentals_page=3#rentals"')
+
+
+class RequestStatsTests(TestCase):
+    def setUp(self):
+        instrumentation.registry.reset()
+
+    @override_settings(TABLEGAMES_QUERY_STATS_HEADER=True)
+    def test_stats_are_aggregated_per_url_name(self):
+        for _ in range(3):
+            response = self.client.get('/games/')
+            self.assertIn('queries=', response['X-Query-Stats'])
+
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get('/stats/requests/').json()['endpoints']
+
+        self.assertEqual(stats['game_list']['requests'], 3)
+        self.assertGreater(stats['game_list']['avg_queries'], 0)
+        self.assertEqual(set(stats['game_list']['total_ms']), {'p50', 'p95', 'p99'})
+
+    def test_template_time_is_measured_by_backend(self):
+        template = loader.get_template('tablegames/includes/section_pagination.html')
+        self.assertIsInstance(template, instrumentation.TimedTemplate)
+        # Класс Template самого Django не подменяется
+        self.assertEqual(DjangoTemplate.render.__module__, 'django.template.backends.django')
+
+        record = instrumentation.RequestRecord()
+        token = instrumentation._current_record.set(record)
+        try:
+            template.render({})
+        finally:
+            instrumentation._current_record.reset(token)
+        self.assertGreater(record.template_ms, 0)
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.force_login(User.objects.create_user('regular', password='secret'))
+        response = self.client.get('/stats/requests/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_reservoir_is_bounded(self):
+        reservoir = instrumentation.Reservoir(size=10)
+        for value in range(1000):
+            reservoir.add(value)
+        self.assertEqual(len(reservoir.values), 10)
+        self.assertEqual(reservoir.seen, 1000)
+
+
+class BenchmarkBaselineTests(TestCase):
+    def report(self, p95_ms, avg_queries, errors=0):
+        return {'scenarios': {'game_list': {'p95_ms': p95_ms, 'avg_queries': avg_queries, 'errors': errors}}}
+
+    def test_compare_gates_on_queries_and_errors_only_by_default(self):
+        baseline = self.report(20.0, 3)
+        # Задержки зависят от машины: без tolerance медленный прогон не регрессия
+        self.assertEqual(benchmark.compare(self.report(200.0, 4), baseline), [])
+
+        regressions = benchmark.compare(self.report(20.0, 5, errors=2), baseline)
+        self.assertEqual(len(regressions), 2, regressions)
+
+    def test_compare_checks_latency_when_tolerance_given(self):
+        baseline = self.report(20.0, 3)
+        self.assertEqual(benchmark.compare(self.report(24.0, 3), baseline, tolerance=0.25), [])
+        regressions = benchmark.compare(self.report(30.0, 3), baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 1, regressions)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='secret')
+        cls.customer = Customer.objects.create(user=cls.user, phone='', address='Москва')
+        Game.objects.bulk_create([
+            Game(
+                name=f'Игра {index}', description='', category='family', price=Decimal('100.00'),
+                rental_price_per_day=Decimal('10.00'), min_players=2, max_players=4, play_time_minutes=30,
+                difficulty=1, in_stock=10, available_for_rental=0,
+            )
+            for index in range(20)
+        ])
+        cls.games = list(Game.objects.order_by('pk'))
+
+    def fill_cart(self, lines):
+        cart, created = Cart.objects.get_or_create(user=self.user)
+        for game in self.games[:lines]:
+            CartItem.objects.create(cart=cart, game=game, quantity=2, unit_price=game.price)
+        cart.refresh_from_db()
+        return cart
+
+    def write_count(self, lines):
+        cart = self.fill_cart(lines)
+        with CaptureQueriesContext(connection) as queries:
+            place_order(cart, self.customer)
+        return sum(1 for query in queries if query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE'))
+
+    def test_write_statements_do_not_grow_with_cart(self):
+        # Первый заказ резервирует блок номеров - это разовые записи
+        self.write_count(1)
+        self.assertEqual(self.write_count(2), self.write_count(20))
+
+    def test_order_lines_stock_and_cart(self):
+        order = place_order(self.fill_cart(3), self.customer)
+
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.total_amount, Decimal('600.00'))
+        self.assertEqual(Game.objects.get(pk=self.games[0].pk).in_stock, 8)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.total_items, cart.items.count()), (0, 0))
+
+
+class OrderNumberTests(TransactionTestCase):
+    def test_blocks_are_unique_across_threads(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Нужна файловая тестовая база: потоки используют отдельные соединения')
+        allocator = numbering.BlockAllocator('test', size=5)
+        results = run_concurrently(lambda: [allocator.next() for _ in range(12)], [()] * 6)
+
+        numbers = [number for result in results for number in result]
+        self.assertEqual(len(numbers), len(set(numbers)), results)
+        for result in results:
+            self.assertEqual(result, sorted(result))
+
+    def test_block_from_rolled_back_transaction_is_discarded(self):
+        allocator = numbering.BlockAllocator('test', size=10)
+        try:
+            with transaction.atomic():
+                self.assertEqual(allocator.next(), 1)
+                raise ValueError
+        except ValueError:
+            pass
+
+        # Счетчик откатился вместе с транзакцией: блок 1-10 выдается заново,
+        # а не продолжается из памяти
+        self.assertEqual(allocator.next(), 1)
+        self.assertEqual(allocator.next(), 2)
+        with transaction.atomic():
+            self.assertEqual(allocator.next(), 3)
+        self.assertEqual(allocator.next(), 4)
+
+    def test_rollback_is_noticed_inside_next_transaction_and_savepoint(self):
+        allocator = numbering.BlockAllocator('test', size=10)
+        with self.assertRaises(ValueError), transaction.atomic():
+            allocator.next()
+            raise ValueError
+        # Новая транзакция сразу после отката: блок не продолжается из памяти
+        with transaction.atomic():
+            self.assertEqual(allocator.next(), 1)
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.assertEqual(allocator.next(), 11)
+                raise ValueError
+            # Точку сохранения с резервированием откатили - диапазон выдается заново
+            self.assertEqual(allocator.next(), 11)
+        # Коммит подтвердил последний блок - дальше номера идут из памяти
+        with self.assertNumQueries(0):
+            self.assertEqual(allocator.next(), 12)
+
+    def test_order_number_format(self):
+        self.assertRegex(numbering.next_order_number(), r'^ORD-\d{7}$')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        self.failures = 0
+        tasks = dict(jobs.TASKS, record=self.record, flaky=self.flaky)
+        patcher = mock.patch.dict(jobs.TASKS, tasks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, value):
+        self.calls.append(value)
+
+    def flaky(self):
+        if self.failures < 2:
+            self.failures += 1
+            raise RuntimeError('временная ошибка')
+
+    def test_enqueue_waits_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            jobs.enqueue('record', {'value': 1})
+            self.assertFalse(Job.objects.exists())
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(jobs.work(worker='test', once=True), 1)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = Job.objects.create(task='flaky', max_attempts=3)
+
+        with self.assertLogs('tablegames.jobs', 'WARNING') as logs:
+            jobs.work(worker='test', once=True)
+        self.assertIn('временная ошибка', logs.output[0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_at, timezone.now())
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('tablegames.jobs', 'WARNING'):
+            jobs.work(worker='test', once=True)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        jobs.work(worker='test', once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 3))
+
+    def test_job_exhausting_attempts_fails(self):
+        job = Job.objects.create(task='missing', max_attempts=1)
+        with self.assertLogs('tablegames.jobs', 'ERROR'):
+            jobs.work(worker='test', once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('missing', job.last_error)
+
+    def test_abandoned_job_is_reclaimed(self):
+        stale = timezone.now() - datetime.timedelta(seconds=jobs.LEASE_SECONDS + 1)
+        job = Job.objects.create(task='record', payload={'value': 2}, status='running', attempts=1,
+                                 locked_by='dead', locked_at=stale)
+
+        jobs.work(worker='test', once=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('done', 2, 'test'))
+        self.assertEqual(self.calls, [2])
+
+
+class AsyncCartEndpointTests(TestCase):
+    async def test_add_update_and_count(self):
+        user = await User.objects.acreate_user('async-buyer', password='secret')
+        game = await Game.objects.acreate(
+            name='Дженга', description='', category='party', price=Decimal('900.00'),
+            rental_price_per_day=Decimal('50.00'), min_players=1, max_players=8, play_time_minutes=15,
+            difficulty=1, in_stock=2, available_for_rental=0,
+        )
+        client = AsyncClient()
+        await client.aforce_login(user)
+
+        responses = [(await client.post(f'/cart/add/{game.pk}/')).json() for _ in range(3)]
+        self.assertEqual([response['success'] for response in responses], [True, True, False])
+        self.assertEqual((await client.get('/cart/count/')).json(), {'count': 2})
+
+        item = await CartItem.objects.aget(cart__user=user)
+        response = await client.post(
+            f'/cart/update/{item.pk}/', data=json.dumps({'action': 'decrease'}), content_type='application/json',
+        )
+        self.assertEqual(response.json()['cart_total'], 900.0)
+        self.assertEqual((await client.get('/cart/count/')).json(), {'count': 1})
+
+
+class BatchCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('batcher', password='secret')
+        cls.games = [
+            Game.objects.create(
+                name=f'Игра {index}', description='', category='card', price=Decimal('100.00'),
+                rental_price_per_day=Decimal('10.00'), min_players=2, max_players=4, play_time_minutes=20,
+                difficulty=1, in_stock=2, available_for_rental=0,
+            )
+            for index in range(3)
+        ]
+
+    def batch(self, *operations):
+        return self.client.post('/cart/batch/', data=json.dumps({
+            'operations': [{'game_id': game.pk, 'delta': delta} for game, delta in operations],
+        }), content_type='application/json')
+
+    def test_operations_are_merged_clamped_and_totalled(self):
+        self.client.force_login(self.user)
+        first, second, third = self.games
+
+        data = self.batch((first, 1), (first, 2), (second, 1)).json()
+        self.assertEqual(data['items'][str(first.pk)]['quantity'], 2)
+        self.assertEqual(len(data['warnings']), 1)
+        self.assertEqual((data['cart_total'], data['cart_price']), (3, 300.0))
+
+        data = self.batch((first, -5), (second, 1), (third, 1)).json()
+        self.assertEqual(data['items'][str(first.pk)]['quantity'], 0)
+        self.assertEqual((data['cart_total'], data['cart_price']), (3, 300.0))
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(sorted(cart.items.values_list('game_id', 'quantity')), [(second.pk, 2), (third.pk, 1)])
+        self.assertEqual(self.client.get('/cart/count/').json(), {'count': 3})
+
+    def test_decrease_above_stock_clamps_without_warning(self):
+        self.client.force_login(self.user)
+        first = self.games[0]
+        cart = Cart.objects.create(user=self.user)
+        # Остаток упал ниже количества в корзине
+        CartItem.objects.create(cart=cart, game=first, quantity=5, unit_price=first.price)
+
+        data = self.batch((first, -1)).json()
+        self.assertEqual(data['items'][str(first.pk)]['quantity'], 2)
+        self.assertEqual(data['warnings'], [])
+
+        data = self.batch((first, 1)).json()
+        self.assertEqual(len(data['warnings']), 1)
+
+    def test_invalid_payload_is_rejected(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/cart/batch/', data='{"operations": [{"game_id": "x"}]}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RentalCapacityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('renter', password='secret')
+        cls.customer = Customer.objects.create(user=user, phone='', address='')
+        cls.game = Game.objects.create(
+            name='Кодовые имена', description='', category='party', price=Decimal('1500.00'),
+            rental_price_per_day=Decimal('100.00'), min_players=2, max_players=8, play_time_minutes=20,
+            difficulty=1, in_stock=0, available_for_rental=2,
+        )
+        cls.start = datetime.date.today() + datetime.timedelta(days=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def day(self, offset):
+        return self.start + datetime.timedelta(days=offset)
+
+    def rent(self, first, last, quantity=1, status='pending'):
+        # Кеш занятости сбрасывается после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            return GameRental.objects.create(
+                customer=self.customer, game=self.game, rental_start_date=self.day(first),
+                rental_end_date=self.day(last), quantity=quantity, total_price=Decimal('100.00'), status=status,
+            )
+
+    def test_overlapping_rentals_reduce_capacity_per_day(self):
+        self.rent(0, 3)
+        self.rent(2, 5, status='active')
+        self.rent(0, 10, quantity=2, status='cancelled')
+
+        self.assertEqual(rentals.calendar(self.game, self.start, 6), [1, 1, 0, 1, 1, 2])
+        self.assertEqual(rentals.max_free(self.game, self.day(0), self.day(2)), 1)
+        self.assertEqual(rentals.max_free(self.game, self.day(1), self.day(4)), 0)
+        # День возврата уже свободен
+        self.assertEqual(rentals.max_free(self.game, self.day(5), self.day(8)), 2)
+
+    def test_cached_occupancy_is_invalidated_by_new_rentals(self):
+        self.assertEqual(rentals.max_free(self.game, self.day(0), self.day(3)), 2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            GameRental.objects.create(
+                customer=self.customer, game=self.game, rental_start_date=self.day(1),
+                rental_end_date=self.day(2), quantity=2, total_price=Decimal('100.00'),
+            )
+            # До коммита кеш не сбрасывается: иначе параллельный запрос заполнил бы его снова старыми данными
+            self.assertEqual(rentals.max_free(self.game, self.day(0), self.day(3)), 2)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(rentals.max_free(self.game, self.day(0), self.day(3)), 0)
+
+    def test_commit_rejects_overbooking(self):
+        self.rent(0, 3, quantity=2)
+        rental = GameRental(
+            customer=self.customer, game=self.game, rental_start_date=self.day(2),
+            rental_end_date=self.day(4), quantity=1, total_price=Decimal('200.00'),
+        )
+        with self.assertRaises(rentals.RentalUnavailable):
+            rentals.commit_rental(rental)
+
+        rental.rental_start_date = self.day(3)
+        rentals.commit_rental(rental)
+        self.assertIsNotNone(rental.pk)
+
+    def test_restore_rental_stock_returns_only_unfinished_rentals(self):
+        self.rent(0, 3)
+        self.rent(0, 3, status='active')
+        self.rent(-5, -2, quantity=2, status='completed')
+        self.rent(0, 3, quantity=2, status='cancelled')
+
+        out = StringIO()
+        call_command('restore_rental_stock', '--dry-run', stdout=out)
+        self.assertIn('Кодовые имена: 2 -> 4', out.getvalue())
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.available_for_rental, 2)
+
+        call_command('restore_rental_stock', stdout=StringIO())
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.available_for_rental, 4)
+
+
+class LifecycleSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('sweeper', password='secret')
+        cls.customer = Customer.objects.create(user=user, phone='', address='')
+        cls.table = GameTable.objects.create(name='Стол 1', table_type='small', capacity=4)
+        cls.game = Game.objects.create(
+            name='Каркассон', description='', category='family', price=Decimal('2000.00'),
+            rental_price_per_day=Decimal('100.00'), min_players=2, max_players=5, play_time_minutes=40,
+            difficulty=2, in_stock=0, available_for_rental=3,
+        )
+        cls.today = timezone.localdate()
+
+    def book(self, days, hour, status):
+        return TableBooking.objects.create(
+            customer=self.customer, table=self.table, booking_date=self.today + datetime.timedelta(days=days),
+            start_time=datetime.time(hour), end_time=datetime.time(hour + 1), number_of_people=2,
+            total_price=Decimal('500.00'), status=status,
+        )
+
+    def rent(self, end_days, status):
+        return GameRental.objects.create(
+            customer=self.customer, game=self.game,
+            rental_start_date=self.today + datetime.timedelta(days=end_days - 3),
+            rental_end_date=self.today + datetime.timedelta(days=end_days),
+            total_price=Decimal('300.00'), status=status,
+        )
+
+    def test_expired_rows_are_transitioned_in_batches(self):
+        done = [self.book(-2, hour, 'confirmed') for hour in (10, 12, 14)]
+        unconfirmed = self.book(-1, 10, 'pending')
+        upcoming = self.book(1, 10, 'confirmed')
+        self.rent(0, 'active')
+        self.rent(-1, 'active')
+        self.rent(1, 'active')
+
+        batches = []
+        results = lifecycle.sweep_bookings(batch=2, on_batch=batches.append)
+        results += lifecycle.sweep_rentals(batch=2)
+
+        self.assertEqual([progress.updated for progress in results], [3, 1, 2, 0])
+        self.assertEqual(len(batches), 3)
+        for booking in done:
+            booking.refresh_from_db()
+            self.assertEqual(booking.status, 'completed')
+        unconfirmed.refresh_from_db()
+        upcoming.refresh_from_db()
+        self.assertEqual((unconfirmed.status, upcoming.status), ('completed', 'confirmed'))
+        self.assertEqual(
+            list(GameRental.objects.order_by('pk').values_list('status', flat=True)),
+            ['completed', 'completed', 'active'],
+        )
+
+        # Повторный запуск ничего не меняет
+        results = lifecycle.sweep_bookings() + lifecycle.sweep_rentals()
+        self.assertEqual(sum(progress.updated for progress in results), 0)
+
+    def test_past_pending_rows_are_completed_not_cancelled(self):
+        # Брони и аренды с сайта создаются в pending и так в нем и остаются
+        booking = self.book(-1, 10, 'pending')
+        rental = self.rent(-1, 'pending')
+        lifecycle.sweep_bookings()
+        lifecycle.sweep_rentals()
+        booking.refresh_from_db()
+        rental.refresh_from_db()
+        self.assertEqual((booking.status, rental.status), ('completed', 'completed'))
+
+    def test_command_reports_throughput(self):
+        self.book(-1, 10, 'confirmed')
+        out = StringIO()
+        call_command('sweep_lifecycle', stdout=out)
+        self.assertIn('Переведено записей: 1', out.getvalue())
+        self.assertIn('строк/с', out.getvalue())
+
+
+class DatabaseTuningTests(TestCase):
+    def journal_mode(self, name):
+        # Отдельное соединение к отдельному файлу: смена режима журнала
+        # требует монопольной блокировки, а TestCase держит транзакцию
+        wrapper = connections['default'].__class__({**connection.settings_dict, 'NAME': name}, 'tuning')
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)
+                cursor.execute('PRAGMA journal_mode')
+                return cursor.fetchone()[0]
+        finally:
+            wrapper.close()
+
+    def test_wal_is_enabled_only_by_setting(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Нужна база SQLite')
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/tuning.sqlite3'
+            with override_settings(TABLEGAMES_SQLITE_WAL=False):
+                self.assertEqual(self.journal_mode(path), 'delete')
+            with override_settings(TABLEGAMES_SQLITE_WAL=True):
+                self.assertEqual(self.journal_mode(f'file:{path}?mode=ro'), 'delete')
+                self.assertEqual(self.journal_mode(path), 'wal')
+
+    def test_read_aliases_do_not_begin_immediate(self):
+        with mock.patch.dict('os.environ', {'TABLEGAMES_READ_CONNECTION': '1', 'TABLEGAMES_REPLICAS': '/tmp/a.sqlite3'}):
+            spec = importlib.util.find_spec('tablegames_site.settings')
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        self.assertEqual(module.DATABASES['default']['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        for alias in ('read', 'replica1'):
+            self.assertNotIn('transaction_mode', module.DATABASES[alias]['OPTIONS'])
+            self.assertEqual(module.DATABASES[alias]['OPTIONS']['timeout'], 20)
+
+    @override_settings(TABLEGAMES_READ_DATABASES=['replica1'])
+    def test_catalog_reads_use_replicas_outside_writes(self):
+        router = routers.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Cart), 'default')
+        self.assertEqual(router.db_for_write(Game), 'default')
+        # TestCase держит открытую транзакцию - имитируем автокоммит
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(router.db_for_read(Game), 'replica1')
+            self.assertEqual(router.db_for_read(GameTable), 'replica1')
+        self.assertEqual(router.db_for_read(Game), 'default')
+
+    @override_settings(TABLEGAMES_READ_DATABASES=['replica1'])
+    def test_writes_pin_user_to_primary(self):
+        router = routers.PrimaryReplicaRouter()
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Game))
+            if request.method == 'POST':
+                router.db_for_write(Cart)
+                seen.append(router.db_for_read(Game))
+            return HttpResponse()
+
+        middleware = routers.PrimaryStickinessMiddleware(view)
+        factory = RequestFactory()
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertNotIn(routers.STICKY_COOKIE, middleware(factory.get('/')).cookies)
+            response = middleware(factory.post('/'))
+            request = factory.get('/')
+            request.COOKIES[routers.STICKY_COOKIE] = response.cookies[routers.STICKY_COOKIE].value
+            middleware(request)
+        self.assertEqual(seen, ['replica1', 'replica1', 'default', 'default'])
+
+
+class HomepageSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = Game.objects.create(
+            name='Азул', description='', category='family', price=Decimal('2500.00'),
+            rental_price_per_day=Decimal('150.00'), min_players=2, max_players=4, play_time_minutes=40,
+            difficulty=2, in_stock=3, available_for_rental=1,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_index_renders_from_snapshot_without_queries(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, 'Азул')
+
+    def test_game_change_marks_snapshot_stale(self):
+        self.assertEqual([game.name for game in homepage.get_snapshot()['games']], ['Азул'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.game.name = 'Азул: Витражи'
+            self.game.save()
+        self.assertEqual([game.name for game in homepage.get_snapshot()['games']], ['Азул: Витражи'])
+
+    def test_concurrent_rebuild_serves_stale_snapshot(self):
+        homepage.get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.invalidate(Game)
+        # Пересборку уже ведет другой запрос
+        cache.add(caching.entry_key('homepage') + ':lock', 1)
+        with self.assertNumQueries(0):
+            snapshot = homepage.get_snapshot()
+        self.assertEqual(len(snapshot['games']), 1)
+
+
+class VersionedCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = [
+            Game.objects.create(
+                name=name, description='', category='strategy', price=Decimal('3000.00'),
+                rental_price_per_day=Decimal('200.00'), min_players=1, max_players=4, play_time_minutes=60,
+                difficulty=3, in_stock=5, available_for_rental=1,
+            )
+            for name in ('Крылья', 'Эверделл')
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_game_detail_is_served_from_cache(self):
+        url = f'/games/{self.games[0].pk}/'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Крылья')
+        self.assertEqual(self.client.get('/games/999999/').status_code, 404)
+
+    def test_row_dependencies_are_invalidated_independently(self):
+        calls = []
+
+        @caching.cached('test_game', deps=lambda game_id: [(Game, game_id)])
+        def load(game_id):
+            calls.append(game_id)
+            return Game.objects.get(pk=game_id).in_stock
+
+        first, second = (game.pk for game in self.games)
+        self.assertEqual((load(first), load(second)), (5, 5))
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve({first: 2})
+        self.assertEqual((load(first), load(second)), (3, 5))
+        self.assertEqual(calls, [first, second, first])
+
+    def test_batch_recomputes_only_invalidated_keys(self):
+        batches = []
+
+        def compute(keys):
+            batches.append(sorted(keys))
+            return {key: key.upper() for key in keys}
+
+        deps = {'a': [(TableBooking, 'a')], 'b': [(TableBooking, 'b')]}
+        self.assertEqual(caching.get_many_or_compute(deps, compute), {'a': 'A', 'b': 'B'})
+        self.assertEqual(caching.get_many_or_compute(deps, compute), {'a': 'A', 'b': 'B'})
+        with self.captureOnCommitCallbacks(execute=True):
+            caching.invalidate(TableBooking, ['b'])
+        caching.get_many_or_compute(deps, compute)
+        self.assertEqual(batches, [['a', 'b'], ['b']])
+
+    def test_card_versions_follow_game_rows(self):
+        first, second = cards.attach_versions(self.games)
+        versions = (first.card_version, second.card_version)
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve({first.pk: 1})
+        cards.attach_versions([first, second])
+        self.assertNotEqual(first.card_version, versions[0])
+        self.assertEqual(second.card_version, versions[1])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = Game.objects.create(
+            name='Манчкин', description='', category='party', price=Decimal('1200.00'),
+            rental_price_per_day=Decimal('80.00'), min_players=3, max_players=6, play_time_minutes=60,
+            difficulty=1, in_stock=4, available_for_rental=1,
+        )
+        GameTable.objects.create(name='Стол 1', table_type='small', capacity=4)
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, headers={'if-none-match': response['ETag']})
+
+    def test_unchanged_game_detail_returns_304_until_stock_changes(self):
+        url = f'/games/{self.game.pk}/'
+        response = self.client.get(url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve({self.game.pk: 1})
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        response = self.client.get('/games/')
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.revalidate('/games/', response).status_code, 304)
+
+        user = User.objects.create_user('viewer', password='secret')
+        self.client.force_login(user)
+        authenticated = self.revalidate('/games/', response)
+        self.assertEqual(authenticated.status_code, 200)
+        self.assertNotIn('Last-Modified', authenticated)
+
+    def test_table_list_revalidates_only_without_filters(self):
+        response = self.client.get('/tables/')
+        self.assertEqual(self.revalidate('/tables/', response).status_code, 304)
+        filtered = self.client.get('/tables/', {'booking_date': '2030-01-01'})
+        self.assertNotIn('ETag', filtered)
+
+
+class InventoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.plenty = create_game('Колонизаторы', in_stock=5)
+        cls.scarce = create_game('Ужас Аркхэма', in_stock=1)
+
+    def stock(self):
+        return list(Game.objects.filter(pk__in=[self.plenty.pk, self.scarce.pk]).order_by('pk')
+                    .values_list('in_stock', flat=True))
+
+    def test_reserve_is_all_or_nothing(self):
+        with self.assertRaises(inventory.InsufficientStock) as caught:
+            inventory.reserve({self.plenty.pk: 2, self.scarce.pk: 2})
+        self.assertEqual(caught.exception.game.pk, self.scarce.pk)
+        self.assertEqual(self.stock(), [5, 1])
+
+        inventory.reserve([(self.plenty, 1), (self.plenty.pk, 1), (self.scarce.pk, 1)])
+        self.assertEqual(self.stock(), [3, 0])
+
+    def test_reserve_unknown_game_raises(self):
+        with self.assertRaises(Game.DoesNotExist):
+            inventory.reserve({999999: 1})
+
+    def test_release_returns_stock(self):
+        inventory.release({self.plenty.pk: 2, self.scarce.pk: 0})
+        self.assertEqual(self.stock(), [7, 1])
+
+    def test_reserve_and_release_refresh_facet_counts(self):
+        cache.clear()
+        self.assertEqual(catalog.facet_counts()['in_stock'][True], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve({self.scarce.pk: 1})
+        self.assertEqual(catalog.facet_counts()['in_stock'][True], 1)
+        self.assertEqual(catalog.filtered_count({'in_stock': True}), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.release({self.scarce.pk: 1})
+        self.assertEqual(catalog.facet_counts()['in_stock'][True], 2)
+
+    def test_stock_changes_keep_counts_without_stock_facets(self):
+        cache.clear()
+        catalog.filtered_count()
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.reserve({self.scarce.pk: 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.filtered_count(), 2)
+
+
+class CartTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', password='secret')
+        cls.cheap = create_game('Уно', price=Decimal('300.00'))
+        cls.pricey = create_game('Глумхэвен', price=Decimal('9000.00'))
+
+    def setUp(self):
+        self.cart = Cart.objects.create(user=self.user)
+
+    def totals(self):
+        self.cart.refresh_from_db()
+        return self.cart.total_items, self.cart.total_price
+
+    def test_totals_follow_item_changes(self):
+        item = CartItem.objects.create(cart=self.cart, game=self.cheap, quantity=2)
+        CartItem.objects.create(cart=self.cart, game=self.pricey)
+        self.assertEqual(self.totals(), (3, Decimal('9600.00')))
+
+        item.quantity = 1
+        item.save()
+        self.assertEqual(self.totals(), (2, Decimal('9300.00')))
+
+        item.delete()
+        self.assertEqual(self.totals(), (1, Decimal('9000.00')))
+
+        CartItem.objects.filter(cart=self.cart).delete()
+        self.assertEqual(self.totals(), (0, Decimal('0.00')))
+
+    def test_concurrent_increments_are_not_lost(self):
+        CartItem.objects.create(cart=self.cart, game=self.cheap)
+        # Две загрузки одной позиции - как два параллельных запроса "+"
+        first, second = CartItem.objects.get(cart=self.cart), CartItem.objects.get(cart=self.cart)
+        self.assertTrue(first.adjust_quantity(1, limit=5))
+        self.assertTrue(second.adjust_quantity(1, limit=5))
+        self.assertEqual(second.quantity, 3)
+        self.assertEqual(self.totals(), (3, Decimal('900.00')))
+
+        self.assertFalse(second.adjust_quantity(3, limit=5))
+        self.assertTrue(first.adjust_quantity(-2))
+        self.assertFalse(first.adjust_quantity(-1))
+        self.assertEqual(self.totals(), (1, Decimal('300.00')))
+
+    def test_adjust_uses_stored_price_after_price_change(self):
+        CartItem.objects.create(cart=self.cart, game=self.cheap)
+        item = CartItem.objects.get(cart=self.cart)
+        # sync_cart_prices обновляет цену в строке, загруженная позиция о ней не знает
+        self.cheap.price = Decimal('400.00')
+        self.cheap.save()
+        self.assertTrue(item.adjust_quantity(1))
+        self.assertEqual(item.unit_price, Decimal('400.00'))
+        self.assertEqual(self.totals(), (2, Decimal('800.00')))
+
+    def test_stale_instance_save_keeps_totals_consistent(self):
+        CartItem.objects.create(cart=self.cart, game=self.cheap)
+        first, second = CartItem.objects.get(cart=self.cart), CartItem.objects.get(cart=self.cart)
+        first.quantity = second.quantity = 2
+        first.save()
+        second.save()
+        self.assertEqual(self.totals(), (2, Decimal('600.00')))
+
+    def test_recalculate_totals_repairs_drift(self):
+        CartItem.objects.create(cart=self.cart, game=self.cheap, quantity=2)
+        empty = Cart.objects.create(user=User.objects.create_user('browser', password='secret'))
+        Cart.objects.update(total_items=42, total_price=Decimal('1.00'))
+
+        self.assertEqual(Cart.recalculate_totals(), 2)
+        self.assertEqual(self.totals(), (2, Decimal('600.00')))
+        empty.refresh_from_db()
+        self.assertEqual((empty.total_items, empty.total_price), (0, Decimal('0.00')))
+
+
+class CartCountCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('counter', password='secret')
+        cls.games = [create_game('Диксит'), create_game('Имаджинариум')]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def cart_queries(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            count = client.get('/cart/count/').json()['count']
+        return count, [q['sql'] for q in queries if '"tablegames_cart"' in q['sql']]
+
+    def test_count_is_served_from_session_until_another_device_changes_cart(self):
+        self.client.post(f'/cart/add/{self.games[0].pk}/')
+        self.assertEqual(self.cart_queries(self.client), (1, []))
+
+        other_device = self.client_class()
+        other_device.force_login(self.user)
+        other_device.post(f'/cart/add/{self.games[1].pk}/')
+
+        count, queries = self.cart_queries(self.client)
+        self.assertEqual(count, 2)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.cart_queries(self.client), (2, []))
+
+    def test_deleting_game_refreshes_count(self):
+        for game in self.games:
+            self.client.post(f'/cart/add/{game.pk}/')
+        self.assertEqual(self.cart_queries(self.client), (2, []))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Game.objects.get(pk=self.games[0].pk).delete()
+        self.assertEqual(self.cart_queries(self.client)[0], 1)
+
+
+class TableAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('planner', password='secret')
+        cls.customer = Customer.objects.create(user=user, phone='', address='')
+        cls.small = GameTable.objects.create(name='Малый', table_type='small', capacity=4)
+        cls.large = GameTable.objects.create(name='Большой', table_type='large', capacity=8)
+        GameTable.objects.create(name='Закрыт', table_type='small', capacity=4, is_active=False)
+        cls.date = datetime.date.today() + datetime.timedelta(days=3)
+
+    def book(self, table, start, end, status='confirmed'):
+        return TableBooking.objects.create(
+            customer=self.customer, table=table, booking_date=self.date,
+            start_time=datetime.time(*start), end_time=datetime.time(*end),
+            number_of_people=2, total_price=Decimal('500.00'), status=status,
+        )
+
+    def free(self, start, end, people=None):
+        tables = availability.free_tables(self.date, datetime.time(*start), datetime.time(*end), people)
+        return [table.name for table in tables]
+
+    def test_long_booking_covers_later_short_one(self):
+        self.book(self.small, (10,), (18,))
+        self.book(self.small, (11,), (12,))
+        self.book(self.large, (12,), (14,), status='cancelled')
+        # Пересечение находит только префиксный максимум окончаний
+        self.assertEqual(self.free((13,), (14,)), ['Большой'])
+        # Интервалы полуоткрытые: бронь встык не конфликтует
+        self.assertEqual(self.free((18,), (20,)), ['Малый', 'Большой'])
+        self.assertEqual(self.free((18,), (20,), people=6), ['Большой'])
+        self.assertFalse(availability.is_table_free(self.small, self.date, datetime.time(9), datetime.time(10, 30)))
+
+
+class AvailabilityGridTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('gridder', password='secret')
+        cls.customer = Customer.objects.create(user=user, phone='', address='')
+        cls.table = GameTable.objects.create(name='Стол', table_type='small', capacity=4)
+        cls.date = datetime.date.today() + datetime.timedelta(days=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_slot_bitmap_marks_overlapped_slots(self):
+        bitmap = availability.slot_bitmap([(datetime.time(0), datetime.time(1)), (datetime.time(1, 45), datetime.time(2))])
+        self.assertEqual(int(bitmap, 16), 0b1011)
+        self.assertEqual(len(bitmap), availability.SLOTS_PER_DAY // 4)
+
+    def test_grid_endpoint_reflects_new_bookings(self):
+        def busy():
+            response = self.client.get('/booking/availability/', {'start': self.date.isoformat(), 'days': 2})
+            [table] = response.json()['tables']
+            return {day: int(bitmap, 16) for day, bitmap in table['busy'].items()}
+
+        self.assertEqual(set(busy().values()), {0})
+        with self.assertNumQueries(1):
+            busy()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TableBooking.objects.create(
+                customer=self.customer, table=self.table, booking_date=self.date,
+                start_time=datetime.time(10), end_time=datetime.time(11),
+                number_of_people=2, total_price=Decimal('500.00'), status='confirmed',
+            )
+        self.assertEqual(busy()[self.date.isoformat()], 0b11 << 20)
+
+
+class CatalogPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = [create_game(f'Игра {index}', difficulty=1 + index % 2) for index in range(7)]
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, page):
+        return [game.name for game in page.games]
+
+    def test_keyset_pages_walk_forward_and_back(self):
+        first = catalog.get_page(page_size=3)
+        self.assertEqual(self.names(first), ['Игра 0', 'Игра 1', 'Игра 2'])
+        self.assertEqual((first.has_previous, first.has_next, first.total), (False, True, 7))
+
+        second = catalog.get_page(after=first.next_cursor, page_size=3)
+        self.assertEqual(self.names(second), ['Игра 3', 'Игра 4', 'Игра 5'])
+        last = catalog.get_page(after=second.next_cursor, page_size=3)
+        self.assertEqual(self.names(last), ['Игра 6'])
+        self.assertEqual((last.has_previous, last.has_next, last.next_cursor), (True, False, None))
+
+        # Назад от последней страницы - та же вторая страница в прямом порядке
+        back = catalog.get_page(before=last.previous_cursor, page_size=3)
+        self.assertEqual(self.names(back), self.names(second))
+        self.assertTrue(back.has_previous and back.has_next)
+        self.assertFalse(catalog.get_page(before=back.previous_cursor, page_size=3).has_previous)
+
+    def test_cursor_respects_filters(self):
+        page = catalog.get_page({'difficulty': 2}, after=self.games[1].pk, page_size=2)
+        self.assertEqual(self.names(page), ['Игра 3', 'Игра 5'])
+        self.assertEqual((page.total, page.has_next), (3, False))
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.named = create_game('Каркассон', description='Стратегия о строительстве городов')
+        cls.described = create_game('Королевство', description='Похожа на каркассон, но с королями')
+        cls.other = create_game('Диксит', description='Игра ассоциаций')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tokenize_drops_stop_words_and_endings(self):
+        self.assertEqual(search.tokenize('Ёлочные Игры и the Castles'), ['елочн', 'игр', 'castles'])
+        self.assertEqual(search.stem('стратегия'), 'стратег')
+        # Основа не короче трех букв, латиница не стеммится
+        self.assertEqual(search.stem('кот'), 'кот')
+        self.assertEqual(search.stem('games'), 'games')
+
+    def test_name_match_ranks_above_description(self):
+        self.assertEqual(search.search_ids('каркассон'), [self.named.pk, self.described.pk])
+        # Последнее слово ищется и как префикс
+        self.assertEqual(search.search_ids('карк'), [self.named.pk, self.described.pk])
+        self.assertEqual(search.search_ids('и на'), [])
+
+    def test_admin_matches_are_not_truncated(self):
+        with mock.patch.object(search, 'CANDIDATES_PER_TERM', 1):
+            self.assertEqual(search.search_ids('каркассон'), [self.named.pk])
+            matches = Game.objects.filter(pk__in=search.matching_ids('каркассон'))
+            self.assertEqual({game.pk for game in matches}, {self.named.pk, self.described.pk})
+
+    def test_backfill_migration_indexes_existing_games(self):
+        migration = importlib.import_module('tablegames.migrations.0013_backfill_search_index')
+        GameSearchToken.objects.all().delete()
+        migration.backfill_search_index(apps, None)
+        self.assertEqual(search.search_ids('диксит'), [self.other.pk])
+
+
+class GameCardFragmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = create_game('Каркассон')
+        cls.user = User.objects.create_user('buyer', password='secret')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_buttons_follow_page_and_user_around_cached_fragment(self):
+        response = self.client.get('/games/search/', {'q': 'каркассон'})
+        self.assertContains(response, '?next=/games/search/%3Fq%3D')
+
+        response = self.client.get('/games/', {'category': 'strategy'})
+        self.assertContains(response, '?next=/games/%3Fcategory%3Dstrategy')
+
+        self.client.force_login(self.user)
+        response = self.client.get('/games/')
+        self.assertContains(response, f'data-game-id="{self.game.pk}"')
+        self.assertNotContains(response, 'Войти для покупки')
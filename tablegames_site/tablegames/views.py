@@ -1,46 +1,101 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.db import transaction
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
-from .models import Game, GameTable, TableBooking, GameRental, PurchaseOrder, Customer, OrderItem, Cart, CartItem
-from .forms import TableBookingForm, GameRentalForm, PurchaseOrderForm, CustomerForm, CustomUserCreationForm, LoginForm, OrderConfirmationForm
+from .models import Game, GameTable, TableBooking, GameRental, PurchaseOrder, Customer, Cart, CartItem
+from .forms import TableBookingForm, GameRentalForm, PurchaseOrderForm, CustomerForm, CustomUserCreationForm, LoginForm, OrderConfirmationForm, TableAvailabilityForm, GameFilterForm
+from . import availability, cards, cart_batch, catalog, conditional, homepage, instrumentation, inventory, rentals, search
+from .activity import CustomerActivity
+from .bookings import BookingConflict, commit_booking
+from .checkout import EmptyCart, place_order
+from .rentals import RentalUnavailable, commit_rental
+from .cart_cache import aget_cart_count, aremember_cart_count, remember_cart_count
 from decimal import Decimal
 import datetime
 import json
 
 def index(request):
-    games = Game.objects.filter(in_stock__gt=0)[:6]
-    tables = GameTable.objects.filter(is_active=True)
+    # Снимок из кеша: пока он актуален, главная не обращается к базе
+    snapshot = homepage.get_snapshot()
     return render(request, 'tablegames/index.html', {
-        'games': games,
-        'tables': tables
+        'games': cards.attach_versions(snapshot['games']),
+        'tables': snapshot['tables'],
     })
 
 
+def _cursor(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+@conditional.game_list
 def game_list(request):
-    games = Game.objects.all()
-    category = request.GET.get('category')
-    if category:
-        games = games.filter(category=category)
+    counts = catalog.facet_counts()
+    filter_form = GameFilterForm(request.GET, facet_counts=counts)
+    filters = filter_form.cleaned_data if filter_form.is_valid() else {}
+
+    page = catalog.get_page(
+        filters,
+        after=_cursor(request.GET.get('after')),
+        before=_cursor(request.GET.get('before')),
+    )
+
+    # Параметры фильтров для ссылок пагинации
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
 
     return render(request, 'tablegames/game_list.html', {
+        'games': cards.attach_versions(page.games),
+        'page': page,
+        'category': filters.get('category'),
+        'categories': [(key, label, counts['category'][key]) for key, label in Game.GAME_CATEGORIES],
+        'total_games': counts['total'],
+        'filter_form': filter_form,
+        'filter_query': query.urlencode(),
+    })
+
+
+def game_search(request):
+    query = request.GET.get('q', '').strip()
+    games = search.search_games(query, queryset=catalog.card_queryset()) if query else []
+    cards.attach_versions(games)
+    return render(request, 'tablegames/game_search.html', {
         'games': games,
-        'category': category
+        'query': query
     })
 
 
+@conditional.game_detail
 def game_detail(request, game_id):
-    game = get_object_or_404(Game, id=game_id)
+    game = catalog.load_game(game_id)
+    if game is None:
+        raise Http404('Игра не найдена')
     return render(request, 'tablegames/game_detail.html', {'game': game})
 
 
+@conditional.table_list
 def table_list(request):
-    tables = GameTable.objects.filter(is_active=True)
-    return render(request, 'tablegames/table_list.html', {'tables': tables})
+    filter_form = TableAvailabilityForm(request.GET or None)
+    if filter_form.is_valid():
+        # Один запрос по броням дня вместо проверки каждого столика
+        tables = availability.free_tables(
+            filter_form.cleaned_data['booking_date'],
+            filter_form.cleaned_data['start_time'],
+            filter_form.cleaned_data['end_time'],
+            filter_form.cleaned_data['number_of_people'],
+            tables=GameTable.objects.filter(is_active=True),
+        )
+    else:
+        tables = catalog.active_tables()
+    return render(request, 'tablegames/table_list.html', {'tables': tables, 'filter_form': filter_form})
 
 
 def register_view(request):
@@ -103,36 +158,78 @@ def create_booking(request):
         form = TableBookingForm(request.POST)
         if form.is_valid():
             try:
-                with transaction.atomic():
-                    booking = form.save(commit=False)
-
-                    customer, created = Customer.objects.get_or_create(
-                        user=request.user,
-                        defaults={'phone': '', 'address': ''}
-                    )
-                    booking.customer = customer
-
-                    duration_hours = (datetime.datetime.combine(
-                        booking.booking_date, booking.end_time
-                    ) - datetime.datetime.combine(
-                        booking.booking_date, booking.start_time
-                    )).seconds / 3600
-
-                    booking.total_price = Decimal(
-                        duration_hours) * booking.table.price_per_hour_per_person * booking.number_of_people
-                    booking.save()
-
-                    messages.success(request, 'Столик успешно забронирован!')
-                    return redirect('booking_success', booking_id=booking.id)
-
+                booking = form.save(commit=False)
+
+                customer, created = Customer.objects.get_or_create(
+                    user=request.user,
+                    defaults={'phone': '', 'address': ''}
+                )
+                booking.customer = customer
+
+                duration_hours = (datetime.datetime.combine(
+                    booking.booking_date, booking.end_time
+                ) - datetime.datetime.combine(
+                    booking.booking_date, booking.start_time
+                )).seconds / 3600
+
+                booking.total_price = Decimal(
+                    duration_hours) * booking.table.price_per_hour_per_person * booking.number_of_people
+                # Повторная проверка пересечений под блокировкой столика на этот день
+                commit_booking(booking)
+
+                messages.success(request, 'Столик успешно забронирован!')
+                return redirect('booking_success', booking_id=booking.id)
+
+            except BookingConflict as e:
+                form.add_error(None, str(e))
             except Exception as e:
                 messages.error(request, f'Произошла ошибка при бронировании: {str(e)}')
     else:
-        form = TableBookingForm()
+        initial = {}
+        if request.GET.get('table'):
+            initial['table'] = request.GET['table']
+        form = TableBookingForm(initial=initial)
+
+        filter_form = TableAvailabilityForm(request.GET)
+        if filter_form.is_valid():
+            # Предлагаем только столики, свободные на выбранное время
+            initial.update(filter_form.cleaned_data)
+            form = TableBookingForm(initial=initial)
+            free_ids = [table.pk for table in availability.free_tables(**filter_form.cleaned_data)]
+            form.fields['table'].queryset = GameTable.objects.filter(pk__in=free_ids)
 
     return render(request, 'tablegames/booking_create.html', {'form': form})
 
 
+def booking_availability(request):
+    try:
+        start_date = datetime.date.fromisoformat(request.GET['start']) if request.GET.get('start') \
+            else timezone.localdate()
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Неверный формат даты или периода'}, status=400)
+    days = max(1, min(days, 31))
+
+    tables = list(GameTable.objects.filter(is_active=True).only('id', 'name', 'capacity'))
+    grid = availability.availability_grid(start_date, days, tables)
+
+    return JsonResponse({
+        'success': True,
+        'start': start_date.isoformat(),
+        'days': days,
+        'slot_minutes': availability.SLOT_MINUTES,
+        'tables': [
+            {
+                'id': table.id,
+                'name': table.name,
+                'capacity': table.capacity,
+                'busy': {day.isoformat(): bitmap for day, bitmap in grid[table.id].items()},
+            }
+            for table in tables
+        ],
+    })
+
+
 @login_required
 def create_rental(request, game_id=None):
     game = None
@@ -143,26 +240,24 @@ def create_rental(request, game_id=None):
         form = GameRentalForm(request.POST)
         if form.is_valid():
             try:
-                with transaction.atomic():
-                    rental = form.save(commit=False)
+                rental = form.save(commit=False)
 
-                    customer, created = Customer.objects.get_or_create(
-                        user=request.user,
-                        defaults={'phone': '', 'address': ''}
-                    )
-                    rental.customer = customer
+                customer, created = Customer.objects.get_or_create(
+                    user=request.user,
+                    defaults={'phone': '', 'address': ''}
+                )
+                rental.customer = customer
 
-                    rental_days = (rental.rental_end_date - rental.rental_start_date).days
-                    rental.total_price = rental.game.rental_price_per_day * rental_days * rental.quantity
-                    rental.save()
+                rental_days = (rental.rental_end_date - rental.rental_start_date).days
+                rental.total_price = rental.game.rental_price_per_day * rental_days * rental.quantity
+                # Повторная проверка свободных экземпляров на даты под блокировкой игры
+                commit_rental(rental)
 
-                    game = rental.game
-                    game.available_for_rental -= rental.quantity
-                    game.save()
-
-                    messages.success(request, 'Игра успешно арендована!')
-                    return redirect('rental_success', rental_id=rental.id)
+                messages.success(request, 'Игра успешно арендована!')
+                return redirect('rental_success', rental_id=rental.id)
 
+            except RentalUnavailable as e:
+                form.add_error(None, str(e))
             except Exception as e:
                 messages.error(request, f'Произошла ошибка при аренде: {str(e)}')
     else:
@@ -174,6 +269,25 @@ def create_rental(request, game_id=None):
     return render(request, 'tablegames/rental_create.html', {'form': form, 'game': game})
 
 
+def rental_availability(request, game_id):
+    game = get_object_or_404(Game.objects.only('id', 'available_for_rental'), id=game_id)
+    try:
+        start_date = datetime.date.fromisoformat(request.GET['start']) if request.GET.get('start') \
+            else timezone.localdate()
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Неверный формат даты или периода'}, status=400)
+    days = max(1, min(days, rentals.HORIZON_DAYS))
+
+    return JsonResponse({
+        'success': True,
+        'game': game.id,
+        'start': start_date.isoformat(),
+        'stock': game.available_for_rental,
+        'free': rentals.calendar(game, start_date, days),
+    })
+
+
 @login_required
 def create_order(request):
     if request.method == 'POST':
@@ -231,41 +345,42 @@ def profile(request):
     else:
         form = CustomerForm(instance=customer)
 
-    bookings = TableBooking.objects.filter(customer=customer)
-    rentals = GameRental.objects.filter(customer=customer)
-    orders = PurchaseOrder.objects.filter(customer=customer)
+    activity = CustomerActivity(customer, request.GET)
 
     return render(request, 'tablegames/profile.html', {
         'form': form,
-        'bookings': bookings,
-        'rentals': rentals,
-        'orders': orders,
+        'bookings': activity.bookings,
+        'rentals': activity.rentals,
+        'orders': activity.orders,
+        'feed': activity.feed(),
     })
 
 
 @login_required
-def add_to_cart(request, game_id):
+async def add_to_cart(request, game_id):
     if request.method == 'POST':
         try:
-            game = get_object_or_404(Game, id=game_id)
-            cart, created = Cart.objects.get_or_create(user=request.user)
+            user = await request.auser()
+            game = await Game.objects.only('id', 'price').aget(id=game_id)
+            cart, created = await Cart.objects.aget_or_create(user=user)
 
-            cart_item, item_created = CartItem.objects.get_or_create(
+            cart_item, item_created = await CartItem.objects.aget_or_create(
                 cart=cart,
                 game=game,
-                defaults={'quantity': 1}
+                defaults={'quantity': 1, 'unit_price': game.price}
             )
 
             if not item_created:
-                if cart_item.quantity < game.in_stock:
-                    cart_item.quantity += 1
-                    cart_item.save()
-                else:
+                # Итоги корзины обновит adjust_quantity; созданную позицию - save
+                cart_item.cart = cart
+                in_stock = await inventory.aavailable(game.pk)
+                if not await cart_item.aadjust_quantity(1, limit=in_stock):
                     return JsonResponse({
                         'success': False,
-                        'message': f'Нельзя добавить больше {game.in_stock} шт. этого товара'
+                        'message': f'Нельзя добавить больше {in_stock} шт. этого товара'
                     })
 
+            await aremember_cart_count(request, user, cart.total_items)
             return JsonResponse({
                 'success': True,
                 'message': 'Товар добавлен в корзину',
@@ -282,36 +397,35 @@ def add_to_cart(request, game_id):
 
 
 @login_required
-def update_cart_item(request, item_id):
+async def update_cart_item(request, item_id):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             action = data.get('action')
 
-            cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+            user = await request.auser()
+            cart_item = await CartItem.objects.select_related('cart').aget(id=item_id, cart__user=user)
 
             if action == 'increase':
-                if cart_item.quantity < cart_item.game.in_stock:
-                    cart_item.quantity += 1
-                    cart_item.save()
-                else:
+                in_stock = await inventory.aavailable(cart_item.game_id)
+                if not await cart_item.aadjust_quantity(1, limit=in_stock):
                     return JsonResponse({
                         'success': False,
-                        'message': f'Нельзя добавить больше {cart_item.game.in_stock} шт. этого товара'
+                        'message': f'Нельзя добавить больше {in_stock} шт. этого товара'
                     })
             elif action == 'decrease':
-                if cart_item.quantity > 1:
-                    cart_item.quantity -= 1
-                    cart_item.save()
-                else:
-                    cart_item.delete()
+                # Последний экземпляр не уменьшается, а удаляется
+                if not await cart_item.aadjust_quantity(-1):
+                    await cart_item.adelete()
+                    await aremember_cart_count(request, user, cart_item.cart.total_items)
                     return JsonResponse({
                         'success': True,
                         'message': 'Товар удален из корзины',
                         'deleted': True
                     })
             elif action == 'remove':
-                cart_item.delete()
+                await cart_item.adelete()
+                await aremember_cart_count(request, user, cart_item.cart.total_items)
                 return JsonResponse({
                     'success': True,
                     'message': 'Товар удален из корзины',
@@ -319,6 +433,7 @@ def update_cart_item(request, item_id):
                 })
 
             cart = cart_item.cart
+            await aremember_cart_count(request, user, cart.total_items)
             return JsonResponse({
                 'success': True,
                 'quantity': cart_item.quantity,
@@ -336,6 +451,32 @@ def update_cart_item(request, item_id):
     return JsonResponse({'success': False, 'message': 'Неверный запрос'})
 
 
+@login_required
+@require_POST
+def batch_update_cart(request):
+    """Применяет накопленные на странице клики по корзине одним запросом."""
+    try:
+        deltas = cart_batch.parse_operations(json.loads(request.body))
+    except cart_batch.InvalidOperations as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Неверный формат запроса'}, status=400)
+
+    try:
+        cart, items, warnings = cart_batch.apply_operations(request.user, deltas)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': 'Ошибка при обновлении корзины'})
+
+    remember_cart_count(request, cart.total_items)
+    return JsonResponse({
+        'success': True,
+        'items': {str(game_id): item for game_id, item in items.items()},
+        'warnings': warnings,
+        'cart_total': cart.total_items,
+        'cart_price': float(cart.total_price),
+    })
+
+
 @login_required
 def cart_view(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
@@ -363,41 +504,15 @@ def create_order_from_cart(request):
 
         if form.is_valid():
             try:
-                with transaction.atomic():
-                    # Проверяем доступность товаров
-                    for item in items:
-                        if item.quantity > item.game.in_stock:
-                            messages.error(request,
-                                           f'Товар "{item.game.name}" недоступен в количестве {item.quantity} шт.')
-                            return redirect('cart_view')
-
-                    # Создаем заказ
-                    total_amount = sum(item.total_price for item in items)
-                    order = PurchaseOrder.objects.create(
-                        customer=customer,
-                        total_amount=total_amount,
-                        shipping_address=customer.address
-                    )
-
-                    # Создаем элементы заказа
-                    for item in items:
-                        OrderItem.objects.create(
-                            order=order,
-                            game=item.game,
-                            quantity=item.quantity,
-                            price=item.game.price
-                        )
-
-                        # Уменьшаем количество на складе
-                        item.game.in_stock -= item.quantity
-                        item.game.save()
+                order = place_order(cart, customer)
+                remember_cart_count(request, 0)
 
-                    # Очищаем корзину
-                    cart.items.all().delete()
-
-                    messages.success(request, f'Заказ #{order.order_number} успешно создан!')
-                    return redirect('order_success', order_id=order.id)
+                messages.success(request, f'Заказ #{order.order_number} успешно создан!')
+                return redirect('order_success', order_id=order.id)
 
+            except (EmptyCart, inventory.InsufficientStock) as e:
+                messages.error(request, str(e))
+                return redirect('cart_view')
             except Exception as e:
                 messages.error(request, f'Ошибка при создании заказа: {str(e)}')
         else:
@@ -435,14 +550,16 @@ def cancel_order(request, order_id):
     if order.status == 'new':
         try:
             with transaction.atomic():
-                # Возвращаем товары на склад
-                for item in order.items.all():
-                    item.game.in_stock += item.quantity
-                    item.game.save()
-
-                order.status = 'cancelled'
-                order.save()
-                messages.success(request, f'Заказ #{order.order_number} отменен')
+                # Переводим статус условно, чтобы повторная отмена не вернула товары дважды
+                cancelled = PurchaseOrder.objects.filter(id=order.id, status='new').update(
+                    status='cancelled', updated_at=timezone.now()
+                )
+                if cancelled:
+                    # Возвращаем товары на склад
+                    inventory.release(order.items.values_list('game_id', 'quantity'))
+                    messages.success(request, f'Заказ #{order.order_number} отменен')
+                else:
+                    messages.error(request, 'Можно отменять только новые заказы')
         except Exception as e:
             messages.error(request, 'Ошибка при отмене заказа')
     else:
@@ -451,8 +568,13 @@ def cancel_order(request, order_id):
     return redirect('order_list')
 
 
-def get_cart_count(request):
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        return JsonResponse({'count': cart.total_items})
-    return JsonResponse({'count': 0})
\ No newline at end of file
+async def get_cart_count(request):
+    return JsonResponse({'count': await aget_cart_count(request, await request.auser())})
+
+
+@staff_member_required
+def request_stats(request):
+    """Накопленная статистика запросов по именам URL (только для персонала)."""
+    if request.method == 'POST':
+        instrumentation.registry.reset()
+    return JsonResponse({'endpoints': instrumentation.registry.snapshot()})
@@ -27,13 +27,16 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tablegames.routers.PrimaryStickinessMiddleware',
+    'tablegames.instrumentation.QueryStatsMiddleware',
 ]
 
 ROOT_URLCONF = 'tablegames_site.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендера для QueryStatsMiddleware
+        'BACKEND': 'tablegames.instrumentation.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -42,6 +45,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'tablegames.context_processors.cart',
             ],
         },
     },
@@ -53,9 +57,91 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # busy timeout: ждать блокировку записи до 20 с, а не падать с "database is locked"
+            'timeout': 20,
+            # BEGIN IMMEDIATE: транзакция сразу берет блокировку записи и ждет ее
+            # по busy timeout; при DEFERRED повышение чтения до записи падает сразу
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Постоянные соединения для WSGI; под ASGI задайте TABLEGAMES_CONN_MAX_AGE=0
+        'CONN_MAX_AGE': int(os.environ.get('TABLEGAMES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        # Файловая тестовая база: тестам параллельных бронирований нужны отдельные соединения
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Выполняются для каждого нового соединения SQLite (tablegames.database)
+TABLEGAMES_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,
+    'temp_store': 'memory',
+}
+# journal_mode сохраняется в файле базы навсегда, поэтому WAL включается явно
+# (по умолчанию - вне DEBUG): db.sqlite3 из репозитория при разработке не меняется
+TABLEGAMES_SQLITE_WAL = os.environ.get('TABLEGAMES_SQLITE_WAL', '0' if DEBUG else '1') == '1'
+
+# Пул чтения каталога (tablegames.routers.PrimaryReplicaRouter). Запись - только 'default'.
+# TABLEGAMES_READ_CONNECTION=1 - тот же файл SQLite в режиме только для чтения:
+# с TABLEGAMES_SQLITE_WAL витрина не ждет транзакции оформления заказов.
+# TABLEGAMES_REPLICAS=/path/a.sqlite3,/path/b.sqlite3 - реплики (для локальной
+# проверки - копии db.sqlite3); для PostgreSQL опишите реплики в DATABASES
+# и перечислите их в TABLEGAMES_READ_DATABASES.
+TABLEGAMES_READ_DATABASES = []
+# Соединениям чтения BEGIN IMMEDIATE не нужен, а в режиме только для чтения
+# он падает: берем параметры основной базы без transaction_mode
+READ_OPTIONS = {key: value for key, value in DATABASES['default']['OPTIONS'].items() if key != 'transaction_mode'}
+if os.environ.get('TABLEGAMES_READ_CONNECTION'):
+    DATABASES['read'] = {
+        **DATABASES['default'],
+        'OPTIONS': READ_OPTIONS,
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'TEST': {'MIRROR': 'default'},
+    }
+    TABLEGAMES_READ_DATABASES.append('read')
+for number, path in enumerate(filter(None, os.environ.get('TABLEGAMES_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'OPTIONS': READ_OPTIONS,
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    TABLEGAMES_READ_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['tablegames.routers.PrimaryReplicaRouter']
+# Сколько секунд после записи пользователь читает каталог с основной базы
+TABLEGAMES_PRIMARY_STICKY_SECONDS = 5
+
+# Кеш в памяти процесса: LocMemCache вытесняет давно не читанные записи (LRU),
+# когда их больше MAX_ENTRIES. Версии зависимостей tablegames.caching живут в
+# этом же кеше, поэтому при нескольких процессах нужен общий кеш -
+# TABLEGAMES_REDIS_URL=redis://host:6379/0 (нужен пакет redis).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tablegames',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            # При переполнении удаляется 1/10 самых старых записей
+            'CULL_FREQUENCY': 10,
+        },
+    }
+}
+if os.environ.get('TABLEGAMES_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['TABLEGAMES_REDIS_URL'],
+        'TIMEOUT': 300,
+    }
+
+# Версия выкладки входит в ETag страниц каталога: после смены шаблонов
+# браузеры не получат 304 на старую разметку
+TABLEGAMES_RELEASE = os.environ.get('TABLEGAMES_RELEASE', '')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -94,4 +180,8 @@ LOGIN_URL = '/accounts/login/'
 
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
-]
\ No newline at end of file
+]
+
+# Письма фоновых задач (run_jobs); в разработке выводятся в консоль
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'TableGames <noreply@tablegames.local>'